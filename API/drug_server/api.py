@@ -1,21 +1,93 @@
 import json
+import logging
 import numpy as np
 
 import flask
 from flask import request, jsonify, Blueprint, current_app, g
-from utils import better_json_encoder
+from utils import better_json_encoder, dumps_stdlib
 
+import profiling
 from database import get_db
+from loading import DataNotReady
 
 api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
 
 api.json_encoder = better_json_encoder(flask.json.JSONEncoder)
 
+NDJSON = 'application/x-ndjson'
+
 ######################
 # API Starts here
 ######################
 
 
+@api.errorhandler(DataNotReady)
+def data_not_ready(e):
+    response = jsonify({'error': str(e), 'stage': e.stage, 'status': e.status})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+def json_dumps():
+    '''the serializer selected by JSON_SERIALIZER, see utils.get_dumps'''
+    return current_app.extensions.get('json_dumps', dumps_stdlib)
+
+
+def cached_json(endpoint, args, compute, cacheable=None):
+    '''
+    Return compute(db) as a JSON response, served from the result cache when
+    the same endpoint was called with the same args on the same data, code and
+    settings version (see result_cache.result_version);
+    results for which cacheable(result) is false are not stored
+    '''
+    with profiling.phase('load'):
+        db = get_db()
+        cache = current_app.extensions.get('result_cache')
+        version = getattr(db, 'result_version', None)
+    if cache is None or version is None:
+        with profiling.phase('query'):
+            result = compute(db)
+        with profiling.phase('serialize'):
+            return current_app.response_class(json_dumps()(result), mimetype='application/json')
+
+    key = (endpoint, args, version)
+    with profiling.phase('load'):
+        body = cache.get(key)
+    if body is None:
+        with profiling.phase('query'):
+            result = compute(db)
+        with profiling.phase('serialize'):
+            body = json_dumps()(result)
+        if cacheable is None or cacheable(result):
+            cache.put(key, body)
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def wants_ndjson():
+    '''clients opt in to streaming with Accept: application/x-ndjson'''
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def ndjson_response(records):
+    '''stream records one JSON document per line, without materializing the result'''
+    dumps = json_dumps()
+
+    def generate():
+        for record in records:
+            yield dumps(record) + b'\n'
+
+    response = current_app.response_class(generate(), mimetype=NDJSON)
+    response.vary.add('Accept')
+    return response
+
+
+@api.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    cache = current_app.extensions.get('result_cache')
+    return jsonify(cache.stats() if cache else {})
+
+
 @api.route('/test', methods=['GET'])
 def test():
     return 'api test'
@@ -24,10 +96,20 @@ def test():
 @api.route('/diseases', methods=['GET'])
 def get_diseases():
     '''
-    :return: diseaseID[]
+    :return: [diseaseID, treatable][]; one pair per line with Accept: application/x-ndjson
     '''
     db = get_db()
-    return jsonify(db.query_diseases())
+    if wants_ndjson() and hasattr(db, 'iter_diseases'):
+        return ndjson_response(db.iter_diseases())
+    if not hasattr(db, 'diseases_body'):
+        return jsonify(db.query_diseases())
+
+    # Serialized once at load time; clients revalidate with If-None-Match
+    db.stages.require('diseases')
+    response = current_app.response_class(db.diseases_body, mimetype='application/json')
+    response.set_etag(db.diseases_etag)
+    response.vary.add('Accept')
+    return response.make_conditional(request)
 
 
 @api.route('/attention', methods=['GET'])
@@ -39,12 +121,14 @@ def get_attention():
     disease_id = request.args.get('disease', None, type=str)
     drug_id = request.args.get('drug', None, type=str)
 
-    db = get_db()
-    attention = {}
-    attention['disease'] = db.query_attention(disease_id, 'disease')
-    attention['drug'] = db.query_attention(drug_id, 'drug')
+    def compute(db):
+        if not hasattr(db, 'query_attention_many'):
+            return {'disease': db.query_attention(disease_id, 'disease'),
+                    'drug': db.query_attention(drug_id, 'drug')}
+        (disease, drug), _ = db.query_attention_many([(disease_id, 'disease'), (drug_id, 'drug')])
+        return {'disease': disease, 'drug': drug}
 
-    return jsonify(attention)
+    return cached_json('attention', (disease_id, drug_id), compute)
 
 
 @api.route('/attention_pair', methods=['GET'])
@@ -56,10 +140,24 @@ def get_attention_pair():
     disease_id = request.args.get('disease', None, type=str)
     drug_id = request.args.get('drug', None, type=str)
 
-    db = get_db()
-    res = db.query_attention_pair(disease_id, drug_id)
+    return cached_json('attention_pair', (disease_id, drug_id),
+                       lambda db: db.query_attention_pair(disease_id, drug_id))
+
+
+@api.route('/attention_paths', methods=['GET'])
+def get_attention_paths():
+    '''
+    :return: {'paths': path[], 'complete': boolean}, the k most attended simple paths
+        from the disease to the drug; complete is false if the time budget ran out
+    E.g.: [base_url]/api/attention_paths?disease=0&drug=0&k=10
+    '''
+    disease_id = request.args.get('disease', None, type=str)
+    drug_id = request.args.get('drug', None, type=str)
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
 
-    return jsonify(res)
+    return cached_json('attention_paths', (disease_id, drug_id, k),
+                       lambda db: db.query_k_paths(disease_id, drug_id, k),
+                       cacheable=lambda result: result['complete'])
 
 
 @api.route('/drug_predictions', methods=['GET'])
@@ -74,22 +172,62 @@ def get_drug_predictions():
         }
     '''
     disease_id = request.args.get('disease_id', None, type=str)
-    print(f"API - drug_predictions - Requested disease_id: {disease_id}")
+    logger.debug("drug_predictions - Requested disease_id: %s", disease_id)
     
     if not disease_id:
-        print("API - drug_predictions - No disease_id provided, returning empty list")
+        logger.debug("drug_predictions - No disease_id provided, returning empty list")
         return jsonify([])
     
-    db = get_db()
     QUERY_N = 200
     
-    try:
+    def compute(db):
         predictions = db.query_predicted_drugs(
             disease_id=disease_id, query_n=QUERY_N)
-        print(f"API - drug_predictions - Found {len(predictions)} predictions for disease {disease_id}")
-        return jsonify(predictions)
+        logger.debug("drug_predictions - Found %d predictions for disease %s", len(predictions), disease_id)
+        return predictions
+    
+    try:
+        return cached_json('drug_predictions', (disease_id, QUERY_N), compute)
+    except DataNotReady:
+        raise
     except Exception as e:
-        print(f"API - drug_predictions - Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("drug_predictions - Error: %s", e)
         return jsonify({"error": str(e)}), 500
+
+
+@api.route('/drug_predictions/batch', methods=['POST'])
+def get_drug_predictions_batch():
+    '''
+    drug predictions of many diseases in one request
+    E.g.: POST [base_url]/api/drug_predictions/batch
+          {"disease_ids": ["1687.0", "5"], "top_n": 30}
+
+    :return: {disease_id: string, predictions: {score:number, id: string, known: boolean}[]}[]
+        diseases that cannot be resolved get {disease_id, error} instead of predictions;
+        one record per line with Accept: application/x-ndjson
+    '''
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('disease_ids'), list):
+        return jsonify({'error': 'expected a JSON body with a disease_ids list'}), 400
+    top_n = body.get('top_n', 200)
+    if not isinstance(top_n, int) or top_n < 0:
+        return jsonify({'error': 'top_n must be a non-negative integer'}), 400
+
+    db = get_db()
+    records = db.query_predicted_drugs_batch(body['disease_ids'], query_n=top_n)
+    logger.debug("drug_predictions/batch - Requested %d diseases", len(body['disease_ids']))
+    if wants_ndjson():
+        return ndjson_response(records)
+
+    # One record at a time, so the response is never held in memory as a whole
+    dumps = json_dumps()
+
+    def generate():
+        yield b'['
+        for i, record in enumerate(records):
+            yield (b',' if i else b'') + dumps(record)
+        yield b']'
+
+    response = current_app.response_class(generate(), mimetype='application/json')
+    response.vary.add('Accept')
+    return response
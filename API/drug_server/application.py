@@ -1,13 +1,24 @@
 from vis import vis
+from asgi import AsgiApp
 from api import api
 from config import Config, ProductionConfig, DevelopmentConfig, SERVER_ROOT
+from database import init_db, freeze_db
+from metrics import REGISTRY, HTTP_REQUESTS, HTTP_SECONDS, HTTP_BYTES
+import prefork
+import profiling
+from result_cache import ResultCache
+from static_assets import StaticDataIndex
+from utils import get_dumps
 
 from flask_cors import CORS
-from flask import Flask, jsonify, g
+from flask import Flask, jsonify, g, request
 
 import argparse
 
 import os
+import time
+import random
+import logging
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 try:
@@ -15,9 +26,15 @@ try:
 except ImportError:
     import json
 
+logger = logging.getLogger(__name__)
 
-def create_app(config=None):
-    """Create and configure an instance of the Flask application."""
+
+def create_app(config=None, preload=True):
+    """Create and configure an instance of the Flask application.
+
+    With preload, the file-based database starts loading right away (PRELOAD_DB);
+    otherwise call preload_db in the process that will serve requests.
+    """
     app = Flask(__name__)
     CORS(app)
 
@@ -31,6 +48,8 @@ def create_app(config=None):
 
     # print(config)
     app.config.update(config)
+    logging.basicConfig(level=app.config.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
     @app.teardown_appcontext
     def close_db(error):
@@ -45,12 +64,113 @@ def create_app(config=None):
     def hello():
         return 'hello world'
 
+    @app.route('/healthz')
+    def healthz():
+        '''liveness: the process is up and serving requests'''
+        return jsonify({'status': 'ok'})
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.before_request
+    def start_profile():
+        profile_dir = app.config.get('PROFILE_DIR')
+        if profile_dir and (is_on(request.headers.get('X-Profile')) or is_on(request.args.get('profile'))
+                            or random.random() < app.config.get('PROFILE_SAMPLE_RATE', 0.0)):
+            profiling.start(profile_dir, request.path, app.config.get('PROFILE_INTERVAL', 0.005))
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        if 'request_start' in g:
+            HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        if not response.is_streamed and response.content_length is not None:
+            HTTP_BYTES.observe(response.content_length, endpoint=endpoint)
+        profile = profiling.current()
+        if profile is not None:
+            g.profile_status = response.status_code
+            response.headers['X-Profile'] = profile.name
+        return response
+
+    @app.teardown_request
+    def finish_profile(error):
+        if profiling.current() is not None:
+            profiling.finish(method=request.method, path=request.full_path,
+                             status=g.get('profile_status'), error=repr(error) if error else None)
+
+    @app.route('/metrics')
+    def metrics():
+        '''request counts, latencies and response sizes of this process, in the Prometheus text format'''
+        return REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/readyz')
+    def readyz():
+        '''readiness: per-stage loading progress and timings, 503 until all stages are ready'''
+        if app.config.get('USE_NEO4J'):
+            return jsonify({'ready': True, 'stages': {}})
+        stages = init_db(app.config).stages
+        ready = stages.all_ready
+        return jsonify({'ready': ready, 'stages': stages.status()}), 200 if ready else 503
+
+    app.extensions['result_cache'] = result_cache = ResultCache.from_config(app.config)
+    REGISTRY.register_collector('result_cache', lambda: result_cache_metrics(result_cache))
+    app.extensions['json_dumps'] = get_dumps(app.config.get('JSON_SERIALIZER', 'auto'))
+    if app.config.get('STATIC_DATA_SIDECARS'):
+        try:
+            app.extensions['static_data'] = StaticDataIndex(app.config['DATA_FOLDER']).build()
+        except OSError as e:
+            logger.warning(f"Serving static data uncompressed: {e}")
+
     app.register_blueprint(api, url_prefix='/api')
     app.register_blueprint(vis, url_prefix='/')
 
+    if preload:
+        preload_db(app)
+
     return app
 
 
+def preload_db(app):
+    if app.config.get('PRELOAD_DB') and not app.config.get('USE_NEO4J'):
+        init_db(app.config)
+
+
+def is_on(flag):
+    '''boolean query string or header flag: 1, true, yes or on'''
+    return (flag or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def result_cache_metrics(cache):
+    if cache is None:
+        return []
+    stats = cache.stats()
+    return [
+        ('drug_server_result_cache_hits_total', 'counter', 'Result cache hits in memory or on disk', stats['hits']),
+        ('drug_server_result_cache_disk_hits_total', 'counter', 'Result cache hits read from disk', stats['disk_hits']),
+        ('drug_server_result_cache_misses_total', 'counter', 'Result cache misses', stats['misses']),
+        ('drug_server_result_cache_evictions_total', 'counter', 'Result cache entries evicted', stats['evictions']),
+        ('drug_server_result_cache_entries', 'gauge', 'Results held in memory', stats['entries']),
+        ('drug_server_result_cache_bytes', 'gauge', 'Bytes of results held in memory', stats['bytes']),
+        ('drug_server_result_cache_disk_bytes', 'gauge', 'Bytes of result files in RESULT_CACHE_DIR', stats['disk_bytes']),
+    ]
+
+
+def serve_forked(app, host, port, workers):
+    '''
+    Fork-after-load mode: the database is loaded once in the parent, then
+    `workers` processes accept on the same socket and share it copy-on-write.
+    '''
+    from werkzeug.serving import make_server
+
+    # Threads do not survive fork, so the load must be complete before forking
+    init_db(app.config).stages.wait()
+    freeze_db()
+    server = make_server(host, port, app, threaded=True)
+    prefork.serve(server, workers)
+
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--host', default='0.0.0.0',
                     help='Port in which to run the API')
@@ -58,18 +178,42 @@ parser.add_argument('--port', default=8002,
                     help='Port in which to run the API')
 parser.add_argument('--debug', action="store_const", default=True, const=True,
                     help='If true, run Flask in debug mode')
+parser.add_argument('--workers', default=1, type=int,
+                    help='If > 1, load data once and fork this many worker processes')
+parser.add_argument('--asgi', action='store_true',
+                    help='Serve with uvicorn, database queries on a bounded thread pool (see ASYNC_*)')
 
 _args, unknown = parser.parse_known_args()
 
 if _args.debug:
     os.environ['FLASK_ENV'] = 'development'
 
-application = create_app(vars(_args))
+# Processes spawned by multiprocessing, like the CSV ingest workers, re-import this
+# script as __mp_main__; they must not build an app, let alone load the data.
+# Imported by a WSGI server: load now. Run as a script: load in the serving process only
+if __name__ != '__mp_main__':
+    application = create_app(vars(_args), preload=__name__ != '__main__')
+    # For ASGI servers: uvicorn application:asgi_application
+    asgi_application = AsgiApp.from_flask(application)
 
 
 if __name__ == '__main__':
-    application.run(
-        debug=_args.debug,
-        host=_args.host,
-        port=int(_args.port)
-    )
+    if _args.asgi:
+        try:
+            import uvicorn
+        except ImportError:
+            parser.error('--asgi needs uvicorn (pip install uvicorn)')
+        preload_db(application)
+        uvicorn.run(asgi_application, host=_args.host, port=int(_args.port))
+    elif _args.workers > 1:
+        serve_forked(application, _args.host, int(_args.port), _args.workers)
+    else:
+        # The debug reloader re-runs this script in a child (WERKZEUG_RUN_MAIN) that serves
+        # requests; loading in the watching parent too would build the same snapshots twice
+        if not _args.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            preload_db(application)
+        application.run(
+            debug=_args.debug,
+            host=_args.host,
+            port=int(_args.port)
+        )
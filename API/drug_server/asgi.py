@@ -0,0 +1,170 @@
+import io
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes of a streamed response read per executor round trip
+CHUNK_BYTES = 64 * 2**10
+
+
+class AsgiApp:
+    """Serve a WSGI app, the Flask application, to an ASGI server such as uvicorn
+
+    Requests to `inline_paths` (cheap lookups) run on the event loop. All
+    others, which may query the database, run on a bounded thread pool, and at
+    most `max_concurrency` of them are admitted at once; the rest wait on the
+    event loop without holding a thread. Streamed responses are read from the
+    pool too, so a slow generator never blocks the loop.
+    """
+
+    def __init__(self, wsgi_app, workers=8, max_concurrency=64, inline_paths=()):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.inline_paths = tuple(inline_paths)
+        self._executor = None
+        self._semaphore = None
+
+    @classmethod
+    def from_flask(cls, app):
+        return cls(app, workers=app.config.get('ASYNC_WORKERS', 8),
+                   max_concurrency=app.config.get('ASYNC_MAX_CONCURRENCY', 64),
+                   inline_paths=app.config.get('ASYNC_INLINE_PATHS', ()))
+
+    def is_inline(self, path):
+        return any(path == p or path.startswith(p.rstrip('/') + '/') for p in self.inline_paths)
+
+    def _start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='asgi')
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            self._start()
+            body = await read_body(receive)
+            if self.is_inline(scope['path']):
+                await self.handle(scope, body, send, None)
+            else:
+                async with self._semaphore:
+                    await self.handle(scope, body, send, self._executor)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, scope, body, send, executor):
+        """Run the WSGI app on executor, or on the event loop if None, and send its response"""
+        loop = asyncio.get_running_loop()
+
+        def run(fn, *args):
+            if executor is None:
+                future = loop.create_future()
+                future.set_result(fn(*args))
+                return future
+            return loop.run_in_executor(executor, fn, *args)
+
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return written.append
+
+        def call():
+            iterable = self.wsgi_app(wsgi_environ(scope, body), start_response)
+            return iterable, iter(iterable)
+
+        iterable, chunks = await run(call)
+        try:
+            first = await run(read_chunks, chunks)
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            data = b''.join(written) + first[0]
+            written.clear()
+            more = first[1]
+            while more:
+                await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+                data, more = await run(read_chunks, chunks)
+            await send({'type': 'http.response.body', 'body': data})
+        finally:
+            if hasattr(iterable, 'close'):
+                await run(iterable.close)
+
+
+def read_chunks(chunks, limit=CHUNK_BYTES):
+    """Up to about limit bytes of a WSGI response iterator, and whether it has more"""
+    parts, size = [], 0
+    for part in chunks:
+        parts.append(part)
+        size += len(part)
+        if size >= limit:
+            return b''.join(parts), True
+    return b''.join(parts), False
+
+
+async def read_body(receive):
+    parts = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        parts.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(parts)
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ (PEP 3333) of an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import zlib
+import logging
+import shutil
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from utils import get_dumps
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the tree format or the attention algorithm changes
+ATTENTION_STORE_VERSION = 1
+ATTENTION_STORE_DIR = 'attention_snapshot'
+META_FILE = 'meta.json'
+
+# Precomputed kinds: node type passed to query_attention -> nodes it is computed for
+KINDS = ['disease', 'drug']
+
+_dumps = get_dumps()
+
+
+def encode_attention(paths, tree):
+    """Serialize one (paths, tree) result into a compressed blob"""
+    return zlib.compress(_dumps([paths, tree]))
+
+
+class AttentionStore:
+    """Memory-mapped attention trees keyed by node index.
+
+    For each kind, the blob of node i is blobs[offsets[i]:offsets[i + 1]];
+    an empty range means the node was not precomputed.
+    """
+
+    def __init__(self, offsets, blobs):
+        self.offsets = offsets
+        self.blobs = blobs
+
+    @classmethod
+    def open(cls, path, num_nodes):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('version') != ATTENTION_STORE_VERSION:
+            raise ValueError(f"attention store version {meta.get('version')} != {ATTENTION_STORE_VERSION}")
+        if meta.get('num_nodes') != num_nodes:
+            raise ValueError("attention store was built for another graph")
+        offsets = {kind: np.load(os.path.join(path, f'{kind}.offsets.npy'), mmap_mode='r') for kind in KINDS}
+        blobs = {kind: cls._map_blobs(os.path.join(path, f'{kind}.blobs.bin')) for kind in KINDS}
+        return cls(offsets, blobs)
+
+    @staticmethod
+    def _map_blobs(path):
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return sum(int(np.count_nonzero(np.diff(o))) for o in self.offsets.values())
+
+    def get(self, idx, node_type):
+        """Return (paths, tree) for a node, or None if it was not precomputed"""
+        offsets = self.offsets.get(node_type)
+        if offsets is None or idx < 0 or idx + 1 >= len(offsets):
+            return None
+        start, end = offsets[idx], offsets[idx + 1]
+        if start == end:
+            return None
+        paths, tree = json.loads(zlib.decompress(self.blobs[node_type][start:end].tobytes()))
+        return paths, tree
+
+
+# Database shared with forked workers of build_attention_store
+_db = None
+
+
+def _encode_nodes(args):
+    node_type, indices = args
+    incoming = node_type == 'disease'
+    result = []
+    for idx in indices:
+        edge_paths = _db._attention_edge_paths(idx, incoming)
+        paths = [_db._edge_path_to_json(idx, edge_path, incoming) for edge_path in edge_paths]
+        tree = _db._build_tree_from_paths(edge_paths, node_type, idx, incoming)
+        result.append((idx, encode_attention(paths, tree)))
+    return result
+
+
+def build_attention_store(db, path, workers=1, chunk_size=256):
+    """Precompute the attention tree of every disease and drug node of db.graph"""
+    global _db
+    _db = db
+    graph = db.graph
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    node_types = np.asarray(db.nodes.type_codes[:graph.num_nodes])
+    # Workers are forked after loading and share the graph copy-on-write
+    pool = multiprocessing.get_context('fork').Pool(workers) if workers > 1 else None
+    try:
+        for kind in KINDS:
+            start_time = time.time()
+            indices = np.flatnonzero(node_types == db.nodes.type_code(kind)).tolist()
+            chunks = [(kind, indices[i:i + chunk_size]) for i in range(0, len(indices), chunk_size)]
+            results = pool.imap(_encode_nodes, chunks) if pool else map(_encode_nodes, chunks)
+
+            # Chunks come back in node index order, so offsets are a cumulative sum
+            sizes = np.zeros(graph.num_nodes, dtype=np.int64)
+            with open(os.path.join(tmp_path, f'{kind}.blobs.bin'), 'wb') as f:
+                for chunk in results:
+                    for idx, blob in chunk:
+                        f.write(blob)
+                        sizes[idx] = len(blob)
+            offsets = np.zeros(graph.num_nodes + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            np.save(os.path.join(tmp_path, f'{kind}.offsets.npy'), offsets)
+            logger.info(f"Precomputed {len(indices)} {kind} attention trees "
+                        f"({offsets[-1] / 2**20:.1f} MB) in {time.time() - start_time:.2f} seconds")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        _db = None
+
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump({'version': ATTENTION_STORE_VERSION, 'num_nodes': graph.num_nodes, 'created': time.time()}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    from config import Config
+    from database import FileBasedGraphDatabase
+
+    parser = argparse.ArgumentParser(description='Precompute attention trees for every disease and drug')
+    parser.add_argument('--data', default=Config.DATA_FOLDER, help='Data folder (txgnn_data_v2)')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int, help='Worker processes')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    db = FileBasedGraphDatabase(datapath=args.data)
+    fingerprints = db.manifest.fingerprints('attention_trees')
+    store_path = os.path.join(args.data, ATTENTION_STORE_DIR)
+    build_attention_store(db, store_path, workers=args.workers)
+    db.manifest.record('attention_trees', fingerprints)
@@ -0,0 +1,62 @@
+import json
+import time
+import argparse
+
+from utils import better_json_encoder, dumps_stdlib, dumps_orjson, orjson
+
+_encoder = better_json_encoder(json.JSONEncoder)
+
+
+def dumps_encoder(obj):
+    """The former path: better_json_encoder, one default() call per float32"""
+    return json.dumps(obj, cls=_encoder).encode('utf-8')
+
+
+def collect_payloads(db, n):
+    """Real API responses for the first n diseases and drugs"""
+    diseases = [disease_id for disease_id, _ in db.query_diseases()][:n]
+    drug_nodes = db.nodes.ids_of(db.drug_indications[:n])
+    return {
+        'diseases': [db.query_diseases()],
+        'drug_predictions': [db.query_predicted_drugs(disease_id, 200) for disease_id in diseases],
+        'attention': [{'disease': db.query_attention(disease_id, 'disease'), 'drug': db.query_attention(drug_id, 'drug')}
+                      for disease_id, drug_id in zip(diseases, drug_nodes)],
+        'attention_pair': [db.query_attention_pair(disease_id, drug_id)
+                           for disease_id, drug_id in zip(diseases, drug_nodes)],
+    }
+
+
+def bench(dumps, payloads, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for payload in payloads:
+            dumps(payload)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+if __name__ == '__main__':
+    from config import Config
+    from database import FileBasedGraphDatabase
+
+    parser = argparse.ArgumentParser(description='Compare the JSON serializers on real API responses')
+    parser.add_argument('--data', default=Config.DATA_FOLDER, help='Data folder (txgnn_data_v2)')
+    parser.add_argument('-n', default=50, type=int, help='Diseases and drugs to collect responses for')
+    parser.add_argument('--repeat', default=5, type=int)
+    args = parser.parse_args()
+
+    db = FileBasedGraphDatabase(datapath=args.data)
+    serializers = {'better_json_encoder': dumps_encoder, 'stdlib': dumps_stdlib}
+    if orjson is not None:
+        serializers['orjson'] = dumps_orjson
+
+    print(f"{'payload':<18}{'count':>6}{'KB':>9}" + ''.join(f'{name:>21}' for name in serializers))
+    for name, payloads in collect_payloads(db, args.n).items():
+        reference = [json.loads(dumps_encoder(p)) for p in payloads]
+        for serializer, dumps in serializers.items():
+            assert [json.loads(dumps(p)) for p in payloads] == reference, f"{serializer} differs on {name}"
+        size = sum(len(dumps_encoder(p)) for p in payloads) / 1024
+        seconds = [bench(dumps, payloads, args.repeat) for dumps in serializers.values()]
+        timings = ''.join(f'{s * 1000:>12.2f} ms {seconds[0] / s:>5.1f}x' for s in seconds)
+        print(f'{name:<18}{len(payloads):>6}{size:>9.1f}{timings}')
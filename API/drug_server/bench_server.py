@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+
+def rss_mb():
+    """Resident memory of this process and its peak so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        current = None
+    return {'rss_mb': round(current, 1) if current is not None else None, 'max_rss_mb': round(peak, 1)}
+
+
+def measure_load(data_path, cold):
+    """Load the database in this (fresh) process; cold drops the snapshots first so they are rebuilt"""
+    from database import FileBasedGraphDatabase
+    from snapshot import SNAPSHOT_DIR
+    from prediction_store import PREDICTIONS_DIR
+
+    if cold:
+        for name in (SNAPSHOT_DIR, PREDICTIONS_DIR):
+            shutil.rmtree(os.path.join(data_path, name), ignore_errors=True)
+    start_time = time.time()
+    db = FileBasedGraphDatabase(datapath=data_path)
+    seconds = time.time() - start_time
+    return {'seconds': round(seconds, 3), 'stages': db.stages.status(), **rss_mb()}
+
+
+def sample_requests(db, n, rng):
+    """n requests per endpoint, for diseases with predictions and drugs predicted for them"""
+    diseases = db.nodes.ids_of(db.drug_predictions.disease_nodes)
+    pairs = []
+    for disease_id in rng.choice(diseases, n).tolist():
+        drugs = [p['id'] for p in db.query_predicted_drugs(disease_id, 10)] or ['missing']
+        pairs.append((disease_id, drugs[rng.integers(len(drugs))]))
+
+    batch = [{'disease_ids': rng.choice(diseases, 50).tolist(), 'top_n': 50} for _ in range(n)]
+    return {
+        'diseases': [('GET', '/api/diseases', None)] * n,
+        'drug_predictions': [('GET', f'/api/drug_predictions?disease_id={d}', None) for d, _ in pairs],
+        'drug_predictions_batch': [('POST', '/api/drug_predictions/batch', body) for body in batch],
+        'attention': [('GET', f'/api/attention?disease={d}&drug={r}', None) for d, r in pairs],
+        'attention_pair': [('GET', f'/api/attention_pair?disease={d}&drug={r}', None) for d, r in pairs],
+        'attention_paths': [('GET', f'/api/attention_paths?disease={d}&drug={r}&k=5', None) for d, r in pairs],
+    }
+
+
+def bench_endpoint(app, requests, threads):
+    """Latency percentiles and throughput of a list of requests through the Flask test client"""
+    def send(request):
+        method, url, body = request
+        client = app.test_client()
+        start_time = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        size = len(response.get_data())
+        return time.perf_counter() - start_time, response.status_code, size
+
+    start_time = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(send, requests))
+    else:
+        results = [send(request) for request in requests]
+    elapsed = time.perf_counter() - start_time
+
+    seconds = np.array([r[0] for r in results]) * 1000
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'statuses': statuses,
+        'p50_ms': round(float(np.percentile(seconds, 50)), 3),
+        'p90_ms': round(float(np.percentile(seconds, 90)), 3),
+        'p99_ms': round(float(np.percentile(seconds, 99)), 3),
+        'mean_ms': round(float(seconds.mean()), 3),
+        'max_ms': round(float(seconds.max()), 3),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'mean_bytes': int(np.mean([r[2] for r in results])),
+    }
+
+
+def run(args):
+    from config import Config
+
+    # application parses sys.argv and creates its app at import, from Config
+    Config.DATA_FOLDER = args.data
+    Config.BACKGROUND_LOAD = False
+    Config.LOG_LEVEL = 'WARNING'
+    Config.RESULT_CACHE_DIR = None
+    if not args.cache:
+        Config.RESULT_CACHE_BYTES = 0
+    sys.argv = sys.argv[:1]
+
+    report = {
+        'label': args.label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'settings': {'requests': args.requests, 'threads': args.threads, 'result_cache': args.cache,
+                     'seed': args.seed},
+        'files': {name: os.path.getsize(os.path.join(args.data, name)) for name in sorted(os.listdir(args.data))
+                  if os.path.isfile(os.path.join(args.data, name))},
+        'load': {},
+    }
+
+    # Each load in a fresh process, so its time and memory are not shared with the others
+    context = multiprocessing.get_context('spawn')
+    for kind in (['cold'] if args.cold else []) + ['warm']:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            report['load'][kind] = pool.submit(measure_load, args.data, kind == 'cold').result()
+        print(f"{kind} load: {report['load'][kind]['seconds']:.2f} s, {report['load'][kind]['rss_mb']} MB resident")
+
+    import application
+    from database import init_db
+
+    app = application.application
+    db = init_db(app.config)
+    report['graph'] = {'nodes': db.graph.num_nodes, 'edges': db.graph.num_edges,
+                       'diseases': len(db.disease_nodes), 'json_serializer': app.config.get('JSON_SERIALIZER'),
+                       'attention_store': db.attention_store is not None}
+
+    rng = np.random.default_rng(args.seed)
+    report['endpoints'] = {}
+    print(f"{'endpoint':<24}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for name, requests in sample_requests(db, args.requests, rng).items():
+        bench_endpoint(app, requests[:args.warmup], 1)
+        stats = report['endpoints'][name] = bench_endpoint(app, requests, args.threads)
+        print(f"{name:<24}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['throughput_rps']:>10.1f}"
+              f"{stats['errors']:>8}")
+    report['memory'] = rss_mb()
+    return report
+
+
+def compare(base, new):
+    """Print the latency and throughput of new relative to base"""
+    print(f"{'endpoint':<24}{'p50 ms':>18}{'p99 ms':>18}{'req/s':>18}")
+    for name, stats in new['endpoints'].items():
+        old = base['endpoints'].get(name)
+        if old is None:
+            continue
+        cells = [f"{old[key]:>8.2f} {stats[key] / old[key] if old[key] else float('nan'):>7.2f}x"
+                 for key in ('p50_ms', 'p99_ms', 'throughput_rps')]
+        print(f"{name:<24}" + ''.join(f'{cell:>18}' for cell in cells))
+    for kind, load in new['load'].items():
+        if kind in base['load']:
+            print(f"{kind} load: {base['load'][kind]['seconds']:.2f} s -> {load['seconds']:.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark loading and the API endpoints on a data folder '
+                                                 '(see synthetic_kg.py to generate one)')
+    parser.add_argument('--data', required=True, help='Data folder')
+    parser.add_argument('--requests', default=200, type=int, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', default=10, type=int, help='Untimed requests per endpoint first')
+    parser.add_argument('--threads', default=1, type=int, help='Concurrent clients')
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache on')
+    parser.add_argument('--cold', action='store_true', help='Also time a load that rebuilds the snapshots')
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--label', default='', help='Free text stored with the results')
+    parser.add_argument('--out', default=None, help='Results JSON (default bench_<time>.json)')
+    parser.add_argument('--compare', default=None, help='Results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+
+    report = run(args)
+    out = args.out or f"bench_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'build_manifest.json'
+
+# Source files each derived artifact is built from, relative to the data folder
+ARTIFACT_INPUTS = {
+    'graph_snapshot': ['graphmask_output_indication.csv', 'node_name_dict.json'],
+    'predictions': ['filtered_predictions.csv', 'drug_indication_subset.pkl'],
+    # built offline by attention_store.py
+    'attention_trees': ['graphmask_output_indication.csv'],
+}
+
+
+def file_fingerprint(path, previous=None):
+    """Size, mtime and sha256 of a file, or None if it does not exist
+
+    The hash of `previous` is reused while size and mtime are unchanged, so
+    large sources are only re-hashed after they were touched.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+        return dict(previous)
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+class BuildManifest:
+    """Records the source fingerprints every derived artifact was built from"""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.path = os.path.join(data_path, MANIFEST_FILE)
+        self.artifacts = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.artifacts = json.load(f).get('artifacts', {})
+            except (ValueError, OSError) as e:
+                logger.warning(f"Ignoring unreadable build manifest {self.path}: {e}")
+
+    def fingerprints(self, artifact):
+        """Current fingerprints of the inputs of an artifact"""
+        recorded = self.artifacts.get(artifact, {}).get('inputs', {})
+        return {name: file_fingerprint(os.path.join(self.data_path, name), recorded.get(name))
+                for name in ARTIFACT_INPUTS[artifact]}
+
+    def check(self, artifact, artifact_path):
+        """Decide whether a derived artifact can be reused
+
+        :return: (fresh, reason, fingerprints); pass fingerprints to record()
+            after a rebuild so that a source changing mid-build is noticed next time
+        """
+        current = self.fingerprints(artifact)
+        record = self.artifacts.get(artifact)
+        if record is None:
+            return False, "no build record", current
+        if not os.path.exists(artifact_path):
+            return False, "artifact missing", current
+
+        changed = [name for name, fingerprint in current.items()
+                   if (fingerprint or {}).get('sha256') != (record['inputs'].get(name) or {}).get('sha256')]
+        if changed:
+            return False, f"changed inputs: {', '.join(changed)}", current
+
+        # Same content with a new mtime: remember it to skip hashing next time
+        if current != record['inputs']:
+            self.record(artifact, current)
+        return True, "inputs unchanged", current
+
+    def record(self, artifact, fingerprints):
+        self.artifacts[artifact] = {'inputs': fingerprints, 'built': time.time()}
+        tmp_path = f'{self.path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump({'artifacts': self.artifacts}, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -8,6 +8,26 @@ class Config(object):
     STATIC_FOLDER = os.path.join(SERVER_ROOT, 'build/static')
     GNN = 'txgnn_v2'
     USE_NEO4J = False  # Set to False to use file-based implementation
+    PRELOAD_DB = True  # Load the file-based database once at startup instead of on first request
+    BACKGROUND_LOAD = True  # Load in a background thread; endpoints return 503 until their data is ready
+    INGEST_WORKERS = 1  # Processes parsing the attention CSV on a cold build; 0 = one per CPU
+    QUERY_WORKERS = 4  # Threads running the independent halves of /api/attention in parallel
+    STATIC_DATA_SIDECARS = True  # Content-hash ETags and gzip/brotli variants for txgnn_data_v2 files
+    JSON_SERIALIZER = 'auto'  # 'orjson', 'stdlib', or 'auto' to use orjson when installed
+    RESULT_CACHE_BYTES = 256 * 2**20  # Serialized /attention, /attention_pair and /drug_predictions results; 0 = off
+    RESULT_CACHE_DIR = None  # If set, cached results are also stored here and survive restarts
+    RESULT_CACHE_DISK_BYTES = 1024 * 2**20  # Files in RESULT_CACHE_DIR are pruned, least recently used first, to this size
+    PATH_MAX_HOPS = 3  # Longest disease-drug path searched by /api/attention_pair and /api/attention_paths
+    PATH_NODE_BUDGET = 2000  # Nodes expanded per /api/attention_pair search, bounds latency on hubs
+    PATH_TIME_BUDGET = 1.0  # Seconds per /api/attention_paths search; paths found so far are returned
+    LOG_LEVEL = 'INFO'  # Request-path details are logged at DEBUG
+    PROFILE_DIR = None  # If set, profiled requests write flame-graph stacks and phase timings here
+    PROFILE_SAMPLE_RATE = 0.0  # Fraction of requests profiled; X-Profile: 1 or ?profile=1 profiles one request
+    PROFILE_INTERVAL = 0.005  # Seconds between stack samples of a profiled request
+    ASYNC_WORKERS = 8  # --asgi: threads running requests that may query the database
+    ASYNC_MAX_CONCURRENCY = 64  # --asgi: such requests admitted at once, the rest wait on the event loop
+    ASYNC_INLINE_PATHS = ('/api/diseases', '/api/cache_stats', '/healthz', '/readyz', '/metrics')  # --asgi: served on the event loop
+    PATH_RELATION_BLACKLIST = None  # Relations never used in paths; None = path_search.NOT_COOL_REL
     
     def __init__(self):
         # Validate critical paths on initialization
@@ -1,25 +1,56 @@
 import os
 import json
+import hashlib
 import logging
-import pandas as pd
+import gc
 import time  
+import threading
 import pickle 
 from typing import List, Dict, Any
 from neo4j import GraphDatabase
 from neo4j.exceptions import ServiceUnavailable, AuthError
 from flask import current_app, g
 from mykeys import get_keys
-import pandas as pd
-import networkx as nx
+import numpy as np
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from graph_store import CSRGraphStore
+from graph_loader import load_attention_graph
+from snapshot import SNAPSHOT_DIR, open_snapshot, write_snapshot
+from prediction_store import PREDICTIONS_DIR, PredictionStore
+from build_cache import BuildManifest
+from attention_store import ATTENTION_STORE_DIR, AttentionStore
+from loading import LoadStages
+from utils import get_dumps, round_floats
+from path_search import NOT_COOL_REL, KShortestPaths, bidirectional_paths, edge_scores
+from id_resolution import IdResolver
+from metrics import timed
+from result_cache import result_version
+import profiling
 
+logger = logging.getLogger(__name__)
 
 
 class FileBasedGraphDatabase:
     """A drop-in replacement for Neo4jApp that uses files instead of Neo4j"""
     
-    def __init__(self, server="txgnn_v2", datapath='./txgnn_data_v2/', **kwargs):
+    # Loading stages, in order: the disease list is served first, then
+    # predictions, then the attention graph
+    LOAD_STAGES = ['diseases', 'predictions', 'graph']
+    
+    def __init__(self, server="txgnn_v2", datapath='./txgnn_data_v2/', background=False,
+                 ingest_workers=1, path_max_hops=3, path_node_budget=2000,
+                 path_blacklist=None, path_time_budget=1.0, query_workers=4, **kwargs):
         self.data_path = datapath
+        self.ingest_workers = ingest_workers
+        self.path_max_hops = path_max_hops
+        self.path_node_budget = path_node_budget
+        self.path_blacklist = NOT_COOL_REL if path_blacklist is None else path_blacklist
+        self.path_time_budget = path_time_budget
+        self.query_workers = query_workers
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
         self.node_types = [
             "anatomy",
             "biological_process",
@@ -33,25 +64,115 @@ class FileBasedGraphDatabase:
             "pathway"
         ]
         
-        # Initialize the graph
-        self.graph = nx.MultiDiGraph()
-        self.node_types_dict = {}
-        self.node_names = {}
+        # Initialize the graph and the node id dictionary shared by all data
+        self.graph = CSRGraphStore.empty()
+        self.nodes = self.graph.nodes
+        self.drug_indications = np.zeros(0, dtype=np.int32)
+        self.drug_predictions = PredictionStore.empty()
+        self.disease_resolver = IdResolver.empty(self.nodes)
+        self.attention_store = None
+        self._path_engine = None
+        self._path_engine_lock = threading.Lock()
         
-        # Load all required data
-        print("Starting data loading process...")
-        start_time = time.time()
+        # Disease list with a treatable bit per disease, and its serialized response
+        self.disease_nodes = np.zeros(0, dtype=np.int32)
+        self.treatable_bits = np.zeros(0, dtype=np.uint8)
+        self.diseases_body = b'[]'
+        self.diseases_etag = None
         
-        # Load with optimized approach
-        self.load_graph_data_optimized()
-        self.load_predictions()
-        self.load_drug_indications()
+        # Known indications as sorted (disease << 32 | drug) keys, see _known_mask
+        self.known_pairs = np.zeros(0, dtype=np.int64)
         
-        end_time = time.time()
-        print(f"Total data loading time: {end_time - start_time:.2f} seconds")
+        # Fingerprints of the sources of the loaded data, see data_version
+        self.source_fingerprints = {}
         
         # For compatibility with the Neo4j version
         self.session = None
+        
+        # Load all required data, optionally without blocking the caller
+        self.manifest = BuildManifest(self.data_path)
+        self.stages = LoadStages(self.LOAD_STAGES)
+        if background:
+            self._loader = threading.Thread(target=self.load_all, name='db-loader', daemon=True)
+            self._loader.start()
+        else:
+            self.load_all()
+    
+    def load_all(self):
+        """Run every loading stage in order"""
+        logger.info("Starting data loading process...")
+        start_time = time.time()
+        
+        # The graph topology (from the snapshot) is all the disease list needs
+        self.stages.run('diseases', self.load_disease_data)
+        self.stages.run('predictions', self.load_prediction_data)
+        self.stages.run('graph', self.load_attention_data)
+        
+        end_time = time.time()
+        logger.info(f"Total data loading time: {end_time - start_time:.2f} seconds")
+    
+    @property
+    def data_version(self):
+        """Content hash of the sources of the loaded data, used to key cached results"""
+        hashes = {artifact: {name: (fingerprint or {}).get('sha256') for name, fingerprint in inputs.items()}
+                  for artifact, inputs in self.source_fingerprints.items()}
+        return hashlib.sha1(json.dumps(hashes, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
+    @property
+    def result_settings(self):
+        """Settings that change query results, part of the result cache version"""
+        return {'path_max_hops': self.path_max_hops, 'path_node_budget': self.path_node_budget,
+                'path_time_budget': self.path_time_budget, 'path_blacklist': sorted(self.path_blacklist)}
+    
+    @property
+    def result_version(self):
+        """Key of cached results: data version, result format and result_settings"""
+        return result_version(self.data_version, self.result_settings)
+    
+    def load_disease_data(self):
+        self.load_graph_data_optimized()
+        self.index_diseases()
+    
+    def index_diseases(self):
+        """Precompute the disease list, its treatable bitset and the serialized /diseases response"""
+        node_types = self.nodes.type_codes[:self.graph.num_nodes]
+        self.disease_nodes = np.flatnonzero(node_types == self.nodes.type_code('disease')).astype(np.int32)
+        
+        # Mark every node that is the target of a rev_indication edge
+        treatable = np.zeros(self.graph.num_nodes, dtype=bool)
+        is_rev_indication = self.graph.rel == self.graph.relation_code('rev_indication')
+        treatable[self.graph.dst[is_rev_indication]] = True
+        self.treatable_bits = np.packbits(treatable[self.disease_nodes])
+        
+        # rev_indication edges run from the drug to the disease it treats
+        self.known_pairs = np.unique((self.graph.dst[is_rev_indication].astype(np.int64) << 32)
+                                     | self.graph.src[is_rev_indication].astype(np.int64))
+        
+        self.diseases_body = get_dumps()(list(self._iter_diseases()))
+        self.diseases_etag = hashlib.sha1(self.diseases_body).hexdigest()
+        logger.info(f"Indexed {len(self.disease_nodes)} diseases, "
+                    f"{int(treatable[self.disease_nodes].sum())} treatable")
+    
+    def load_prediction_data(self):
+        self.load_drug_indications()
+        self.load_predictions()
+        self.disease_resolver = IdResolver(self.nodes, self.drug_predictions.disease_nodes)
+        logger.info(f"Indexed {len(self.disease_resolver)} id forms of {len(self.drug_predictions)} prediction diseases")
+    
+    def load_attention_data(self):
+        """Page in the graph and open the precomputed attention trees, if they are current"""
+        self.graph.warm()
+        
+        store_path = os.path.join(self.data_path, ATTENTION_STORE_DIR)
+        fresh, reason, _ = self.manifest.check('attention_trees', store_path)
+        if not fresh:
+            logger.info(f"Not using precomputed attention trees ({reason}); run attention_store.py to build them")
+            return
+        try:
+            self.attention_store = AttentionStore.open(store_path, self.graph.num_nodes)
+            logger.info(f"Opened {len(self.attention_store)} precomputed attention trees")
+        except Exception as e:
+            logger.warning(f"Error opening precomputed attention trees: {e}")
     
     def create_session(self):
         """No-op for compatibility with Neo4jApp"""
@@ -62,341 +183,342 @@ class FileBasedGraphDatabase:
         pass
     
     def load_graph_data_optimized(self):
-        """Load graph structure with optimization strategies"""
-        pickle_path = os.path.join(self.data_path, "graph_data.pkl")
-        
-        # Check if pickle file exists and load it
-        if os.path.exists(pickle_path):
-            print(f"Loading preprocessed graph data from {pickle_path}")
+        """Load graph structure from a memory-mapped snapshot, rebuilding it if its sources changed"""
+        snapshot_path = os.path.join(self.data_path, SNAPSHOT_DIR)
+        
+        # Check if the snapshot was built from the current sources and map it
+        fresh, reason, fingerprints = self.manifest.check('graph_snapshot', snapshot_path)
+        self.source_fingerprints['graph_snapshot'] = fingerprints
+        if fresh:
+            logger.info(f"Reusing graph snapshot at {snapshot_path} ({reason})")
             try:
                 start_time = time.time()
-                with open(pickle_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.graph = data['graph']
-                    self.node_types_dict = data['node_types_dict']
-                    self.node_names = data['node_names']
+                self.graph = open_snapshot(snapshot_path)
+                self.nodes = self.graph.nodes
                 end_time = time.time()
-                print(f"Loaded graph data in {end_time - start_time:.2f} seconds")
-                print(f"Loaded {len(self.graph.nodes)} nodes and {len(self.graph.edges)} edges")
+                logger.info(f"Opened graph snapshot in {end_time - start_time:.2f} seconds")
+                logger.info(f"Loaded {self.graph.num_nodes} nodes and {self.graph.num_edges} edges")
                 return
             except Exception as e:
-                print(f"Error loading preprocessed data: {e}")
-                print("Falling back to CSV loading")
+                logger.warning(f"Error opening graph snapshot: {e}")
+                logger.warning("Falling back to CSV loading")
+        else:
+            logger.info(f"Rebuilding graph snapshot ({reason})")
         
-        # Fall back to loading from CSV using chunking
+        # Fall back to loading from CSV
         self.load_graph_data()
+        if self.graph.num_edges == 0:
+            return
         
-        # After loading from CSV, save to pickle for next time
+        # After loading from CSV, write a snapshot for next time
         try:
-            print(f"Saving preprocessed graph data to {pickle_path}")
-            with open(pickle_path, 'wb') as f:
-                pickle.dump({
-                    'graph': self.graph,
-                    'node_types_dict': self.node_types_dict,
-                    'node_names': self.node_names
-                }, f, protocol=4)  # protocol 4 works with larger data
-            print("Preprocessing complete")
+            logger.info(f"Writing graph snapshot to {snapshot_path}")
+            write_snapshot(snapshot_path, self.graph)
+            self.manifest.record('graph_snapshot', fingerprints)
+            # Re-open so this process serves from the shared page cache as well
+            self.graph = open_snapshot(snapshot_path)
+            self.nodes = self.graph.nodes
+            logger.info("Preprocessing complete")
         except Exception as e:
-            print(f"Error saving preprocessed data: {e}")
+            logger.warning(f"Error writing graph snapshot: {e}")
     
     def load_graph_data(self):
-        """Load graph structure from graphmask output file with chunking"""
+        """Load graph structure from graphmask output file with a columnar bulk loader"""
         attention_path = os.path.join(self.data_path, "graphmask_output_indication.csv")
-        print(f"Loading graph data from {attention_path}")
+        logger.info(f"Loading graph data from {attention_path}")
         
         if os.path.exists(attention_path):
             start_time = time.time()
-            
-            # Use pandas chunk reading
-            chunk_size = 100000  # Adjust based on your system's memory
-            total_rows = 0
-            
-            print("Loading in chunks...")
-            for chunk_idx, chunk in enumerate(pd.read_csv(attention_path, 
-                                                       dtype={'x_id': 'string', 'y_id': 'string'},
-                                                       chunksize=chunk_size)):
-                chunk_start = time.time()
-                # Process this chunk
-                for _, row in chunk.iterrows():
-                    src_id, src_type = row['x_id'], row['x_type']
-                    tgt_id, tgt_type = row['y_id'], row['y_type']
-                    rel_type = row['relation']
-                    
-                    # Add nodes with their types
-                    if src_id not in self.node_types_dict:
-                        self.graph.add_node(src_id)
-                        self.node_types_dict[src_id] = src_type
-                        self.node_names[src_id] = row['x_name']
-                        
-                    if tgt_id not in self.node_types_dict:
-                        self.graph.add_node(tgt_id)
-                        self.node_types_dict[tgt_id] = tgt_type
-                        self.node_names[tgt_id] = row['y_name']
-                    
-                    # Add edge with attributes
-                    self.graph.add_edge(
-                        src_id, tgt_id, 
-                        type=rel_type,
-                        layer1_att=row['layer1_att'],
-                        layer2_att=row['layer2_att'],
-                        edge_info=rel_type
-                    )
-                
-                total_rows += len(chunk)
-                chunk_end = time.time()
-                print(f"Processed chunk {chunk_idx+1}, rows: {len(chunk)}, " 
-                      f"total rows: {total_rows}, time: {chunk_end - chunk_start:.2f} seconds")
-            
+            self.graph = load_attention_graph(attention_path, self.load_node_name_dict(),
+                                              workers=self.ingest_workers)
+            self.nodes = self.graph.nodes
             end_time = time.time()
-            print(f"Loaded {len(self.graph.nodes)} nodes and {len(self.graph.edges)} edges "
-                 f"in {end_time - start_time:.2f} seconds")
+            logger.info(f"Loaded {self.graph.num_nodes} nodes and {self.graph.num_edges} edges "
+                        f"in {end_time - start_time:.2f} seconds ({self.graph.nbytes() / 2**20:.1f} MB)")
         else:
-            print(f"Warning: File {attention_path} not found.")
+            logger.warning(f"File {attention_path} not found.")
+            self.graph = CSRGraphStore.empty()
+            self.nodes = self.graph.nodes
+    
+    def load_node_name_dict(self):
+        """Load node_name_dict.json ({node_type: {node_id: name}}) if it exists"""
+        path = os.path.join(self.data_path, "node_name_dict.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
     
     def load_predictions(self):
-        """Load drug predictions from CSV file"""
+        """Load drug predictions from cache or CSV file, restricted to the indication subset"""
         predictions_path = os.path.join(self.data_path, "filtered_predictions.csv")
-        print(f"Loading predictions from {predictions_path}")
+        cache_path = os.path.join(self.data_path, PREDICTIONS_DIR)
+        
+        fresh, reason, fingerprints = self.manifest.check('predictions', cache_path)
+        self.source_fingerprints['predictions'] = fingerprints
+        if fresh:
+            try:
+                start_time = time.time()
+                self.drug_predictions = PredictionStore.open(cache_path, self.nodes)
+                end_time = time.time()
+                logger.info(f"Reusing predictions at {cache_path} ({reason}): {len(self.drug_predictions)} "
+                            f"diseases in {end_time - start_time:.2f} seconds")
+                return
+            except Exception as e:
+                logger.warning(f"Error opening cached predictions: {e}")
+        else:
+            logger.info(f"Rebuilding predictions ({reason})")
         
+        logger.info(f"Loading predictions from {predictions_path}")
         if os.path.exists(predictions_path):
             try:
                 start_time = time.time()
-                
-                # Create dictionary to store predictions
-                self.drug_predictions = {}
-                
-                import csv
-                with open(predictions_path, 'r') as f:
-                    reader = csv.DictReader(f)
-                    rows_count = 0
-                    for row in reader:
-                        rows_count += 1
-                        disease_id = row.get('disease_id', '')
-                        drug_id = row.get('drug_id', '')
-                        score = float(row.get('score', 0))
-                        
-                        # Initialize dict for disease if not exists
-                        if disease_id not in self.drug_predictions:
-                            self.drug_predictions[disease_id] = {}
-                        
-                        # Add drug prediction
-                        self.drug_predictions[disease_id][drug_id] = score
-                
+                self.drug_predictions = PredictionStore.from_csv(
+                    predictions_path, self.nodes, self.drug_indications)
                 end_time = time.time()
-                print(f"Loaded predictions for {len(self.drug_predictions)} diseases from {rows_count} rows in {end_time - start_time:.2f} seconds")
+                logger.info(f"Loaded predictions for {len(self.drug_predictions)} diseases from "
+                            f"{self.drug_predictions.num_rows} rows in {end_time - start_time:.2f} seconds")
                 # Print first 5 disease IDs for debugging
-                print(f"Sample disease IDs in predictions: {list(self.drug_predictions.keys())[:5]}")
+                logger.info(f"Sample disease IDs in predictions: "
+                            f"{self.nodes.ids_of(self.drug_predictions.disease_nodes[:5])}")
+                self.drug_predictions.save(cache_path, self.nodes)
+                self.manifest.record('predictions', fingerprints)
             except Exception as e:
-                print(f"Error loading predictions: {e}")
-                import traceback
-                traceback.print_exc()
-                self.drug_predictions = {}
+                logger.exception(f"Error loading predictions: {e}")
+                self.drug_predictions = PredictionStore.empty()
         else:
-            print(f"Warning: File {predictions_path} not found.")
-            self.drug_predictions = {}
+            logger.warning(f"File {predictions_path} not found.")
+            self.drug_predictions = PredictionStore.empty()
     
     def load_drug_indications(self):
         """Load known drug indications"""
         indications_path = os.path.join(self.data_path, "drug_indication_subset.pkl")
-        print(f"Loading drug indications from {indications_path}")
+        logger.info(f"Loading drug indications from {indications_path}")
         
         if os.path.exists(indications_path):
             start_time = time.time()
             with open(indications_path, 'rb') as f:
-                self.drug_indications = set(pickle.load(f))
+                # Sorted node indices of the drugs in the indication subset
+                self.drug_indications = np.unique(self.nodes.intern_many(pickle.load(f), 'drug'))
             end_time = time.time()
-            print(f"Loaded {len(self.drug_indications)} drug indications in {end_time - start_time:.2f} seconds")
+            logger.info(f"Loaded {len(self.drug_indications)} drug indications in {end_time - start_time:.2f} seconds")
         else:
-            print(f"Warning: File {indications_path} not found.")
-            self.drug_indications = set()
+            logger.warning(f"File {indications_path} not found.")
+            self.drug_indications = np.zeros(0, dtype=np.int32)
     
-    def _get_known_drug_indices(self, disease_id):
-        """Get list of drugs known to treat a disease"""
-        known_drugs = []
-        
-        # Look for reverse indication edges in the graph
-        for neighbor, _ in self.graph.in_edges(disease_id):
-            edge_data = self.graph.get_edge_data(neighbor, disease_id)
-            for key, data in edge_data.items():
-                if data.get('type') == 'rev_indication':
-                    known_drugs.append(neighbor)
-        
-        return list(set(known_drugs))
+    def _known_mask(self, diseases, drugs):
+        """Whether each (disease, drug) pair of node indices is a known indication"""
+        keys = (np.asarray(diseases, dtype=np.int64) << 32) | np.asarray(drugs, dtype=np.int64)
+        if not len(self.known_pairs):
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.known_pairs, keys), len(self.known_pairs) - 1)
+        return self.known_pairs[pos] == keys
     
+    @timed
     def query_diseases(self):
         """Get all disease IDs with flags for whether they are treatable"""
-        # Find all disease nodes
-        disease_nodes = [node for node, attrs in self.graph.nodes(data=True) 
-                        if node in self.node_types_dict and self.node_types_dict[node] == 'disease']
-        
-        # For each disease, check if it has any incoming rev_indication edges
-        result = []
-        for disease_id in disease_nodes:
-            has_treatment = False
-            for u, _ in self.graph.in_edges(disease_id):
-                edge_data = self.graph.get_edge_data(u, disease_id)
-                for key, data in edge_data.items():
-                    if data.get('type') == 'rev_indication':
-                        has_treatment = True
-                        break
-                if has_treatment:
-                    break
-            
-            result.append([disease_id, has_treatment])
-        
-        return result
+        self.stages.require('diseases')
+        return list(self._iter_diseases())
     
+    def iter_diseases(self):
+        """Like query_diseases, but a generator of [disease_id, treatable] records"""
+        self.stages.require('diseases')
+        return self._iter_diseases()
+    
+    def _iter_diseases(self, chunk_size=4096):
+        treatable = np.unpackbits(self.treatable_bits, count=len(self.disease_nodes)).astype(bool)
+        for start in range(0, len(self.disease_nodes), chunk_size):
+            chunk = self.disease_nodes[start:start + chunk_size]
+            yield from ([disease_id, has_treatment] for disease_id, has_treatment
+                        in zip(self.nodes.ids_of(chunk), treatable[start:start + chunk_size].tolist()))
+    
+    @timed
     def query_predicted_drugs(self, disease_id, query_n=200):
         """Get predicted drugs for a disease"""
-        print(f"Database - query_predicted_drugs - Requested disease_id: {disease_id}")
+        logger.debug("query_predicted_drugs - Requested disease_id: %s", disease_id)
+        self.stages.require('predictions')
         
         # Handle empty disease_id
         if not disease_id:
-            print("Database - query_predicted_drugs - Empty disease_id provided")
+            logger.debug("query_predicted_drugs - Empty disease_id provided")
             return []
         
-        if disease_id not in self.drug_predictions:
-            print(f"Database - query_predicted_drugs - disease_id {disease_id} not found in drug_predictions")
-            # Check for similar disease IDs (might be a formatting issue)
-            similar_ids = [k for k in self.drug_predictions.keys() if k.split('.')[0] == disease_id.split('.')[0]]
-            if similar_ids:
-                print(f"Database - query_predicted_drugs - Found similar disease IDs: {similar_ids}")
-                # Try with the first similar ID
-                disease_id = similar_ids[0]
-                print(f"Database - query_predicted_drugs - Using alternative disease_id: {disease_id}")
-            else:
-                return []
-        
-        drugs = self.drug_predictions[disease_id]
-        print(f"Database - query_predicted_drugs - Found {len(drugs)} drugs for disease {disease_id}")
-        
-        # Filter drugs that are in the indications subset
-        filtered_drugs = [(drug_id, score) for drug_id, score in drugs.items() 
-                        if drug_id in self.drug_indications]
-        print(f"Database - query_predicted_drugs - After filtering, {len(filtered_drugs)} drugs remain")
+        disease = self._prediction_disease(disease_id)
+        if disease < 0:
+            return []
         
-        # Sort by score and limit to query_n
-        top_drugs = sorted(filtered_drugs, key=lambda x: x[1], reverse=True)[:query_n]
+        logger.debug("query_predicted_drugs - %d drugs in the indication subset for disease %s",
+                     self.drug_predictions.count(disease), disease_id)
         
-        # Get known drugs
-        known_drugs = self._get_known_drug_indices(disease_id)
+        # Predictions are pre-filtered and pre-sorted by score at load time
+        drug_idx, scores = self.drug_predictions.top(disease, query_n)
+        known = self._known_mask(disease, drug_idx)
         
         # Convert to the expected format
-        result = []
-        for drug_id, score in top_drugs:
-            result.append({
-                'score': float(score),
-                'id': drug_id,
-                'known': drug_id in known_drugs
-            })
+        result = [
+            {'score': score, 'id': drug_id, 'known': is_known}
+            for drug_id, score, is_known in zip(self.nodes.ids_of(drug_idx), scores.tolist(), known.tolist())
+        ]
         
-        print(f"Database - query_predicted_drugs - Returning {len(result)} drug predictions")
+        logger.debug("query_predicted_drugs - Returning %d drug predictions", len(result))
         return result
     
+    @timed
+    def query_predicted_drugs_batch(self, disease_ids, query_n=200):
+        """Get predicted drugs for many diseases, resolved in one pass over the predictions store
+        
+        :return: generator of {'disease_id', 'predictions'} records in request order, or
+            {'disease_id', 'error'} for diseases that cannot be resolved
+        """
+        self.stages.require('predictions')
+        store = self.drug_predictions
+        
+        diseases = self.disease_resolver.resolve_many(disease_ids)
+        slots = np.array([store.slot_of[d] for d in diseases[diseases >= 0].tolist()], dtype=np.int64)
+        
+        # Gather the top query_n slice of every disease with one fancy index
+        starts = store.indptr[slots]
+        counts = np.minimum(store.indptr[slots + 1] - starts, query_n)
+        bounds = np.zeros(len(slots) + 1, dtype=np.int64)
+        np.cumsum(counts, out=bounds[1:])
+        positions = np.repeat(starts - bounds[:-1], counts) + np.arange(bounds[-1])
+        drug_idx = store.drug_idx[positions]
+        drug_ids = self.nodes.ids_of(drug_idx)
+        scores = store.scores[positions].tolist()
+        known = self._known_mask(np.repeat(diseases[diseases >= 0], counts), drug_idx)
+        
+        return self._batch_prediction_records(disease_ids, diseases, bounds, drug_ids, scores, known)
+    
+    def _batch_prediction_records(self, disease_ids, diseases, bounds, drug_ids, scores, known):
+        found = 0
+        for disease_id, disease in zip(disease_ids, diseases):
+            if disease < 0:
+                error = 'invalid disease id' if not isinstance(disease_id, str) or not disease_id \
+                    else 'disease not found in predictions'
+                yield {'disease_id': disease_id, 'error': error}
+                continue
+            start, end = bounds[found], bounds[found + 1]
+            found += 1
+            yield {'disease_id': disease_id, 'predictions': [
+                {'score': score, 'id': drug_id, 'known': is_known}
+                for drug_id, score, is_known in zip(drug_ids[start:end], scores[start:end], known[start:end].tolist())
+            ]}
+    
+    def _prediction_disease(self, disease_id):
+        """Node index of a disease in the predictions store, or -1"""
+        # Also resolves float-formatted and merged ids (might be a formatting issue)
+        disease = self.disease_resolver.resolve(disease_id)
+        if disease < 0:
+            logger.debug("query_predicted_drugs - disease_id %s not found in drug_predictions", disease_id)
+        elif logger.isEnabledFor(logging.DEBUG) and self.nodes.id_of(disease) != disease_id:
+            logger.debug("query_predicted_drugs - Using alternative disease_id: %s", self.nodes.id_of(disease))
+        return disease
+    
+    @timed
     def query_attention(self, node_id, node_type):
         """Build attention tree for a node"""
-        # Constants from Neo4jApp
-        k1 = 5  # upper limit of children for root node
-        k2 = 5  # upper limit of children for hop-1 nodes
+        self.stages.require('graph')
         
         # Empty result for nodes not in graph
-        if node_id not in self.graph.nodes:
+        idx = self.graph.index_of(node_id)
+        if idx < 0:
             return [], {}
         
-        # First, find edge types connecting to this node
-        edge_types = []
-        for u, v, data in self.graph.edges(data=True):
-            if u == node_id or v == node_id:
-                edge_type = data.get('type')
-                if edge_type:
-                    edge_types.append(edge_type)
-        
-        edge_types = list(set(edge_types))
-        results = []
-        
-        # For each edge type, build paths
-        for edge_type in edge_types:
-            # For root node neighbors
-            neighbors = []
-            if node_type == 'disease':
-                # For disease, we're looking at incoming edges
-                for src, _ in self.graph.in_edges(node_id):
-                    edge_data = self.graph.get_edge_data(src, node_id)
-                    for key, data in edge_data.items():
-                        if data.get('type') == edge_type:
-                            neighbors.append((src, data))
-            else:
-                # For other types, look at outgoing edges
-                for _, dst in self.graph.out_edges(node_id):
-                    edge_data = self.graph.get_edge_data(node_id, dst)
-                    for key, data in edge_data.items():
-                        if data.get('type') == edge_type:
-                            neighbors.append((dst, data))
-            
-            # Sort neighbors by attention score
-            neighbors.sort(key=lambda x: x[1].get('layer1_att', 0) + x[1].get('layer2_att', 0), reverse=True)
-            neighbors = neighbors[:k1]
-            
-            # For each hop-1 neighbor, find hop-2 neighbors
-            for neighbor_id, neighbor_data in neighbors:
-                hop2_neighbors = []
-                if node_type == 'disease':
-                    # For disease's neighbors, look at their incoming edges
-                    for src, _ in self.graph.in_edges(neighbor_id):
-                        edge_data = self.graph.get_edge_data(src, neighbor_id)
-                        for key, data in edge_data.items():
-                            hop2_neighbors.append((src, data))
-                else:
-                    # For other types, look at outgoing edges
-                    for _, dst in self.graph.out_edges(neighbor_id):
-                        edge_data = self.graph.get_edge_data(neighbor_id, dst)
-                        for key, data in edge_data.items():
-                            hop2_neighbors.append((dst, data))
-                
-                # Sort hop-2 neighbors by attention score
-                hop2_neighbors.sort(key=lambda x: x[1].get('layer1_att', 0), reverse=True)
-                hop2_neighbors = hop2_neighbors[:k2]
-                
-                # For each hop-2 neighbor, create a path
-                for hop2_id, hop2_data in hop2_neighbors:
-                    path = [
-                        {
-                            'node': {
-                                'id': node_id,
-                                'labels': [self.node_types_dict.get(node_id, 'unknown')]
-                            },
-                            'rel': 'none'
-                        },
-                        {
-                            'node': {
-                                'id': neighbor_id,
-                                'labels': [self.node_types_dict.get(neighbor_id, 'unknown')]
-                            },
-                            'rel': neighbor_data
-                        },
-                        {
-                            'node': {
-                                'id': hop2_id,
-                                'labels': [self.node_types_dict.get(hop2_id, 'unknown')]
-                            },
-                            'rel': hop2_data
-                        }
-                    ]
-                    results.append(path)
-        
-        # Build tree from paths
-        tree = self._build_tree_from_paths(results, node_type, node_id)
+        # Precomputed offline for diseases and drugs
+        if self.attention_store is not None:
+            precomputed = self.attention_store.get(idx, node_type)
+            if precomputed is not None:
+                return precomputed
+        
+        # For disease, we're looking at incoming edges; for other types, outgoing edges
+        incoming = node_type == 'disease'
+        edge_paths = self._attention_edge_paths(idx, incoming)
+        
+        results = [self._edge_path_to_json(idx, edge_path, incoming) for edge_path in edge_paths]
+        tree = self._build_tree_from_paths(edge_paths, node_type, idx, incoming)
         
         return results, tree
     
-    def _build_tree_from_paths(self, paths, node_type, node_id):
+    @timed
+    def query_attention_many(self, queries):
+        """Run query_attention for several (node_id, node_type) pairs in parallel
+        
+        :return: (results, timings) with one (paths, tree) result and one
+            {'id', 'type', 'seconds'} timing per query, in query order
+        """
+        self.stages.require('graph')
+        
+        def run_timed(query):
+            start_time = time.time()
+            result = self.query_attention(*query)
+            return result, time.time() - start_time
+        
+        if len(queries) > 1 and self.query_workers > 1:
+            outcomes = list(self._get_executor().map(profiling.propagate(run_timed), queries))
+        else:
+            outcomes = [run_timed(query) for query in queries]
+        
+        timings = [{'id': node_id, 'type': node_type, 'seconds': round(seconds, 6)}
+                   for (node_id, node_type), (_, seconds) in zip(queries, outcomes)]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("query_attention_many - %s", ", ".join(
+                f"{t['type']} {t['id']}: {t['seconds'] * 1000:.1f} ms" for t in timings))
+        return [result for result, _ in outcomes], timings
+    
+    def _get_path_engine(self):
+        """The k-shortest-paths engine, built on first use since its edge costs are not shared between processes"""
+        if self._path_engine is None:
+            with self._path_engine_lock:
+                if self._path_engine is None:
+                    self._path_engine = KShortestPaths(self.graph, self.path_blacklist)
+        return self._path_engine
+    
+    def _get_executor(self):
+        """Thread pool for sub-queries, created per process since threads do not survive fork"""
+        if self._executor_pid != os.getpid():
+            with self._executor_lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.query_workers, thread_name_prefix='query')
+                    self._executor_pid = os.getpid()
+        return self._executor
+    
+    def _attention_edge_paths(self, idx, incoming):
+        """Two-hop attention paths from a node, as (hop-1 edge id, hop-2 edge id) pairs"""
+        # Constants from Neo4jApp
+        k1 = 5  # upper limit of children for root node
+        k2 = 5  # upper limit of children for hop-1 nodes
+        
+        graph = self.graph
+        edge_paths = []
+        
+        # For each edge type touching the node, its k1 most attended edges are
+        # a prefix of the (node, edge type) segment
+        for edge_type, eids in graph.relation_top_edges(idx, incoming, k1):
+            # For each hop-1 neighbor, its k2 hop-2 edges by attention score
+            for eid, neighbor in zip(eids.tolist(), graph.neighbors(eids, incoming).tolist()):
+                hop2_eids = graph.top_edges_by_layer1(neighbor, incoming, k2)
+                edge_paths.extend((eid, hop2_eid) for hop2_eid in hop2_eids.tolist())
+        
+        return edge_paths
+    
+    def _node_json(self, idx):
+        return {'id': self.nodes.id_of(idx), 'labels': [self.nodes.type_of(idx)]}
+    
+    def _edge_path_to_json(self, idx, edge_path, incoming):
+        """Convert a path of edge ids to the Neo4j-style list of {node, rel} steps"""
+        path = [{'node': self._node_json(idx), 'rel': 'none'}]
+        for eid in edge_path:
+            far_end = self.graph.src[eid] if incoming else self.graph.dst[eid]
+            path.append({'node': self._node_json(far_end), 'rel': self.graph.edge_data(eid)})
+        return path
+    
+    def _build_tree_from_paths(self, edge_paths, node_type, idx, incoming):
         """Convert paths to a tree structure"""
-        if not paths:
+        if not edge_paths:
             return {}
         
         # Initialize tree with root node
         tree = {
-            'nodeId': node_id,
+            'nodeId': self.nodes.id_of(idx),
             'nodeType': node_type,
             'score': 1.0,
             'edgeInfo': '',
@@ -404,35 +526,26 @@ class FileBasedGraphDatabase:
         }
         
         # Track processed nodes to avoid duplicates
-        processed = set([node_id])
+        processed = set([idx])
+        graph = self.graph
         
         # Process each path and add to tree
-        for path in paths:
-            for depth in range(1, len(path)):
-                current = path[depth]
-                current_id = current['node']['id']
+        for edge_path in edge_paths:
+            for eid in edge_path:
+                current = int(graph.src[eid] if incoming else graph.dst[eid])
                 
                 # Skip if already processed
-                if current_id in processed:
+                if current in processed:
                     continue
                 
-                processed.add(current_id)
-                
-                # Calculate score and edge info
-                rel = current['rel']
-                if isinstance(rel, dict):
-                    score = rel.get('layer1_att', 0) + rel.get('layer2_att', 0)
-                    edge_info = rel.get('edge_info', '') or rel.get('type', '')
-                else:
-                    score = 1.0
-                    edge_info = ''
+                processed.add(current)
                 
                 # Add to tree
                 tree['children'].append({
-                    'nodeId': current_id,
-                    'nodeType': self.node_types_dict.get(current_id, 'unknown'),
-                    'score': score,
-                    'edgeInfo': edge_info,
+                    'nodeId': self.nodes.id_of(current),
+                    'nodeType': self.nodes.type_of(current),
+                    'score': graph.layer1_att[eid] + graph.layer2_att[eid],
+                    'edgeInfo': graph.relations[graph.rel[eid]],
                     'children': []
                 })
         
@@ -441,22 +554,61 @@ class FileBasedGraphDatabase:
         
         return tree
     
+    @timed
     def query_attention_pair(self, disease_id, drug_id):
         """Find paths connecting disease and drug nodes"""
-        # Run the original logic to find real paths
-        disease_paths, disease_tree = self.query_attention(disease_id, 'disease')
-        drug_paths, drug_tree = self.query_attention(drug_id, 'drug')
+        self.stages.require('graph')
+        
+        ((_, disease_tree), (_, drug_tree)), _ = self.query_attention_many([(disease_id, 'disease'),
+                                                                           (drug_id, 'drug')])
+        attention = {f'disease:{disease_id}': disease_tree, f'drug:{drug_id}': drug_tree}
         
-        # ... (existing code to find intersections)
+        paths = []
+        disease, drug = self.graph.index_of(disease_id), self.graph.index_of(drug_id)
+        if disease >= 0 and drug >= 0:
+            found = bidirectional_paths(self.graph, disease, drug, max_hops=self.path_max_hops,
+                                        node_budget=self.path_node_budget)
+            paths = [self._pair_path_to_json(disease, eids, score) for score, eids in found]
         
         # If no paths were found, generate synthetic ones
         if len(paths) == 0:
-            print(f"No real paths found between disease {disease_id} and drug {drug_id}, generating synthetic paths")
+            logger.debug("No real paths found between disease %s and drug %s, generating synthetic paths",
+                         disease_id, drug_id)
             paths = self._generate_synthetic_paths(disease_id, drug_id)
         
-        # ... (rest of the method)
-        
-        return {'attention': attention, 'paths': sorted_paths}
+        return {'attention': attention, 'paths': paths}
+    
+    @timed
+    def query_k_paths(self, disease_id, drug_id, k=10):
+        """The k most attended simple paths from a disease to a drug, within the hop limit and time budget"""
+        self.stages.require('graph')
+        
+        disease, drug = self.graph.index_of(disease_id), self.graph.index_of(drug_id)
+        if disease < 0 or drug < 0:
+            return {'paths': [], 'complete': True}
+        
+        found, complete = self._get_path_engine().search(disease, drug, k=k, max_hops=self.path_max_hops,
+                                                  time_budget=self.path_time_budget)
+        if not complete:
+            logger.warning("query_k_paths - time budget exhausted after %d paths between %s and %s",
+                           len(found), disease_id, drug_id)
+        paths = []
+        for cost, eids in found:
+            path = self._pair_path_to_json(disease, eids, float(edge_scores(self.graph, eids).mean()))
+            path['cost'] = cost
+            paths.append(path)
+        return {'paths': paths, 'complete': complete}
+    
+    def _pair_path_to_json(self, start, eids, avg_score):
+        """Convert a disease-to-drug path of edge ids to the {nodes, edges, avg_score} format"""
+        graph = self.graph
+        nodes = [start] + graph.dst[eids].tolist()
+        return {
+            'nodes': [{'nodeId': self.nodes.id_of(idx), 'nodeType': self.nodes.type_of(idx)} for idx in nodes],
+            'edges': [{'edgeInfo': graph.relations[rel], 'score': score}
+                      for rel, score in zip(graph.rel[eids].tolist(), round_floats(edge_scores(graph, eids)))],
+            'avg_score': avg_score
+        }
 
     def _generate_synthetic_paths(self, disease_id, drug_id):
         """Generate synthetic paths when no real ones are found"""
@@ -506,23 +658,22 @@ class FileBasedGraphDatabase:
 
     def _get_disease_proteins(self, disease_id):
         """Get proteins associated with a disease"""
-        proteins = []
-        for neighbor, _ in self.graph.out_edges(disease_id):
-            edge_data = self.graph.get_edge_data(disease_id, neighbor)
-            for key, data in edge_data.items():
-                if data.get('type') == 'disease_protein' and self.node_types_dict.get(neighbor) == 'gene/protein':
-                    proteins.append(neighbor)
-        return proteins
+        return self._get_typed_neighbors(disease_id, 'disease_protein', 'gene/protein')
 
     def _get_drug_targets(self, drug_id):
         """Get proteins targeted by a drug"""
-        targets = []
-        for neighbor, _ in self.graph.out_edges(drug_id):
-            edge_data = self.graph.get_edge_data(drug_id, neighbor)
-            for key, data in edge_data.items():
-                if data.get('type') == 'drug_protein' and self.node_types_dict.get(neighbor) == 'gene/protein':
-                    targets.append(neighbor)
-        return targets
+        return self._get_typed_neighbors(drug_id, 'drug_protein', 'gene/protein')
+
+    def _get_typed_neighbors(self, node_id, edge_type, neighbor_type):
+        """Get out-neighbors reached through edge_type whose node type is neighbor_type"""
+        idx = self.graph.index_of(node_id)
+        if idx < 0:
+            return []
+        eids = self.graph.out_edge_ids(idx)
+        eids = eids[self.graph.rel[eids] == self.graph.relation_code(edge_type)]
+        neighbors = self.graph.neighbors(eids, incoming=False)
+        neighbors = neighbors[self.nodes.type_codes[neighbors] == self.nodes.type_code(neighbor_type)]
+        return self.nodes.ids_of(neighbors)
     
     @staticmethod
     def get_node_labels(node):
@@ -530,22 +681,52 @@ class FileBasedGraphDatabase:
         if isinstance(node, dict) and 'labels' in node:
             return node['labels']
         return ['unknown']
+
+
+# One read-only database per process, shared by all requests and threads
+_shared_db = None
+_shared_db_lock = threading.Lock()
+
+
+def init_db(config):
+    """Load the file-based database once for the whole process"""
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                _shared_db = FileBasedGraphDatabase(
+                    datapath=config['DATA_FOLDER'],
+                    background=config.get('BACKGROUND_LOAD', False),
+                    ingest_workers=config.get('INGEST_WORKERS', 1),
+                    path_max_hops=config.get('PATH_MAX_HOPS', 3),
+                    path_node_budget=config.get('PATH_NODE_BUDGET', 2000),
+                    path_blacklist=config.get('PATH_RELATION_BLACKLIST'),
+                    path_time_budget=config.get('PATH_TIME_BUDGET', 1.0),
+                    query_workers=config.get('QUERY_WORKERS', 4)
+                )
+    return _shared_db
+
+
+def freeze_db():
+    """Prepare the loaded database to be shared copy-on-write by forked workers
+
+    Objects created during loading are moved to the permanent GC generation so
+    that garbage collection in the workers does not touch (and copy) their pages.
+    """
+    gc.collect()
+    gc.freeze()
+
+
 def get_db():
-    if 'db' not in g:
-        use_neo4j = current_app.config.get('USE_NEO4J', False)
-        
-        if use_neo4j:
-            # Original Neo4j implementation
+    if current_app.config.get('USE_NEO4J', False):
+        # Neo4j sessions are per application context
+        if 'db' not in g:
             db = Neo4jApp(server=current_app.config['GNN'], database='neo4j')
             db.create_session()
-        else:
-            # New file-based implementation
-            db = FileBasedGraphDatabase(
-                datapath=current_app.config['DATA_FOLDER']
-            )
-        
-        g.db = db
-    return g.db
+            g.db = db
+        return g.db
+
+    return init_db(current_app.config)
 # %%
 
 
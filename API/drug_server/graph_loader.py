@@ -0,0 +1,186 @@
+import io
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from graph_store import CSRGraphStore, NodeDictionary
+
+logger = logging.getLogger(__name__)
+
+ATTENTION_DTYPES = {
+    'x_id': 'string',
+    'x_type': 'category',
+    'x_name': 'string',
+    'y_id': 'string',
+    'y_type': 'category',
+    'y_name': 'string',
+    'relation': 'category',
+    'layer1_att': np.float32,
+    'layer2_att': np.float32,
+}
+
+# Below this many bytes per worker, parallel parsing is not worth the process startup
+MIN_BYTES_PER_WORKER = 16 * 2**20
+
+
+def read_attention_csv(path):
+    """Read the graphmask attention CSV as typed columns"""
+    return pd.read_csv(path, usecols=list(ATTENTION_DTYPES), dtype=ATTENTION_DTYPES, engine='c')
+
+
+def _interleave(df, x_col, y_col):
+    """Return [x0, y0, x1, y1, ...] so that factorizing keeps first-appearance order"""
+    return np.column_stack([df[x_col].to_numpy(dtype=object), df[y_col].to_numpy(dtype=object)]).ravel()
+
+
+def columnar_part(df):
+    """Factorize one block of attention rows into block-local typed arrays
+
+    Node ids and relations are numbered in order of first appearance within
+    the block; merge_parts maps them to global indices.
+    """
+    df = df.dropna(subset=['x_id', 'y_id'])
+
+    # Node ids -> dense indices
+    node_codes, node_ids = pd.factorize(_interleave(df, 'x_id', 'y_id'))
+
+    # Relation strings -> codes
+    rel, relations = pd.factorize(df['relation'].to_numpy(dtype=object))
+
+    # Type and name of each node come from its first appearance
+    _, first = np.unique(node_codes, return_index=True)
+    return {
+        'node_ids': np.asarray(node_ids, dtype=object),
+        'node_types': _interleave(df, 'x_type', 'y_type')[first],
+        'names': _interleave(df, 'x_name', 'y_name')[first],
+        'src': node_codes[0::2].astype(np.int32),
+        'dst': node_codes[1::2].astype(np.int32),
+        'relations': np.asarray(relations, dtype=object),
+        'rel': rel.astype(np.int16),
+        'layer1_att': df['layer1_att'].to_numpy(dtype=np.float32),
+        'layer2_att': df['layer2_att'].to_numpy(dtype=np.float32),
+    }
+
+
+def _global_codes(parts, key):
+    """Factorize the concatenated block-local uniques; return global uniques, first positions and per-part remaps"""
+    codes, uniques = pd.factorize(np.concatenate([p[key] for p in parts]) if parts else np.zeros(0, dtype=object))
+    _, first = np.unique(codes, return_index=True)
+    bounds = np.cumsum([0] + [len(p[key]) for p in parts])
+    remaps = [codes[start:end].astype(np.int32) for start, end in zip(bounds[:-1], bounds[1:])]
+    return uniques, first, remaps
+
+
+def merge_parts(parts, name_dict=None):
+    """Merge block-local parts (in file order) into one CSRGraphStore
+
+    Blocks are concatenated in file order, so global node and relation
+    numbering is the same first-appearance order as a sequential read.
+
+    :param name_dict: optional {node_type: {node_id: name}} (node_name_dict.json)
+        used for nodes without a name in the CSV
+    """
+    node_ids, first, node_remaps = _global_codes(parts, 'node_ids')
+    relations, _, rel_remaps = _global_codes(parts, 'relations')
+    if not parts:
+        return CSRGraphStore.empty()
+
+    node_types = np.concatenate([p['node_types'] for p in parts])[first]
+    names = np.concatenate([p['names'] for p in parts])[first]
+    if name_dict:
+        missing = pd.isna(names)
+        missing[~missing] = names[~missing] == ''
+        for i in np.flatnonzero(missing):
+            names[i] = name_dict.get(node_types[i], {}).get(node_ids[i])
+    nodes = NodeDictionary.from_lists(node_ids, node_types, names)
+
+    return CSRGraphStore.from_edges(
+        nodes, relations,
+        np.concatenate([remap[p['src']] for p, remap in zip(parts, node_remaps)]),
+        np.concatenate([remap[p['dst']] for p, remap in zip(parts, node_remaps)]),
+        np.concatenate([remap[p['rel']] for p, remap in zip(parts, rel_remaps)]),
+        np.concatenate([p['layer1_att'] for p in parts]),
+        np.concatenate([p['layer2_att'] for p in parts])
+    )
+
+
+def build_graph_store(df, name_dict=None):
+    """Build a CSRGraphStore, with its interned node dictionary, from attention columns"""
+    return merge_parts([columnar_part(df)], name_dict)
+
+
+def byte_ranges(path, num_ranges):
+    """Split the body of a CSV into byte ranges that start and end on line boundaries
+
+    :return: (header line, [(start, end), ...])
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        step = max((size - body_start) // max(num_ranges, 1), 1)
+        bounds = [body_start]
+        for i in range(1, num_ranges):
+            f.seek(max(body_start + i * step, bounds[-1]))
+            f.readline()  # move to the start of the next line
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return header.decode('utf-8'), ranges
+
+
+def _parse_range(args):
+    """Process pool worker: parse one byte range into a columnar part"""
+    path, header, start, end = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    columns = list(pd.read_csv(io.StringIO(header), nrows=0).columns)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=columns,
+                     usecols=list(ATTENTION_DTYPES), dtype=ATTENTION_DTYPES, engine='c')
+    return columnar_part(df)
+
+
+def parse_attention_parallel(path, workers):
+    """Parse the attention CSV in a process pool, one line-aligned byte range per task"""
+    header, ranges = byte_ranges(path, workers)
+    tasks = [(path, header, start, end) for start, end in ranges]
+    # spawn: the loader may run in a background thread, where fork is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(_parse_range, tasks))
+
+
+def ingest_workers(path, workers):
+    """Number of worker processes actually worth using for a file"""
+    workers = workers or os.cpu_count() or 1
+    return max(1, min(workers, os.path.getsize(path) // MIN_BYTES_PER_WORKER))
+
+
+def load_attention_graph(path, name_dict=None, workers=1):
+    """Columnar bulk load of graphmask_output_indication.csv into a CSRGraphStore
+
+    :param workers: parser processes; 0/None uses every CPU. Small files are
+        always parsed in this process.
+    """
+    start_time = time.time()
+    workers = ingest_workers(path, workers)
+    if workers > 1:
+        parts = parse_attention_parallel(path, workers)
+    else:
+        parts = [columnar_part(read_attention_csv(path))]
+    num_rows = sum(len(p['src']) for p in parts)
+    parse_time = time.time()
+    logger.info(f"Parsed {num_rows} rows in {parse_time - start_time:.2f} seconds "
+                f"with {workers} worker(s)")
+
+    graph = merge_parts(parts, name_dict)
+    end_time = time.time()
+    elapsed = max(end_time - start_time, 1e-9)
+    logger.info(f"Built adjacency in {end_time - parse_time:.2f} seconds "
+                f"({num_rows / elapsed:,.0f} rows/second overall)")
+    return graph
@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+
+
+class StringTable:
+    """Immutable list of strings kept in one UTF-8 buffer indexed by offsets"""
+
+    def __init__(self, offsets, buffer):
+        self.offsets = offsets
+        self.buffer = buffer
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [('' if s is None or s != s else str(s)).encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(offsets, buffer)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        data = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield data[start:end].decode('utf-8')
+
+
+class NodeDictionary:
+    """Interns every node id to a dense int32 index shared by all data structures.
+
+    Ids and names live in offset-indexed string buffers and node types are
+    uint8 codes into type_names. Ids met outside the graph (e.g. drugs that
+    only appear in predictions) are appended after the graph nodes, so graph
+    node indices and interned indices are the same numbers.
+    """
+
+    UNKNOWN_TYPE = 255
+
+    def __init__(self, ids, type_codes, type_names, names):
+        self.ids = ids
+        self.type_codes = type_codes
+        self.type_names = list(type_names)
+        self.names = names
+        self._index = None
+        self._base_size = len(ids)
+        self._extra_ids = []
+        self._extra_types = []
+        self._extra_names = []
+
+    @classmethod
+    def from_lists(cls, ids, node_types, names):
+        type_names = sorted({str(t) for t in node_types})
+        type_index = {t: i for i, t in enumerate(type_names)}
+        type_codes = np.array([type_index[str(t)] for t in node_types], dtype=np.uint8)
+        return cls(StringTable.from_strings(ids), type_codes, type_names, StringTable.from_strings(names))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_lists([], [], [])
+
+    @property
+    def index_map(self):
+        # Built lazily so that opening a memory-mapped snapshot stays cheap
+        if self._index is None:
+            self._index = {node_id: i for i, node_id in enumerate(self.ids)}
+            self._index.update((node_id, self._base_size + i) for i, node_id in enumerate(self._extra_ids))
+        return self._index
+
+    def __len__(self):
+        return self._base_size + len(self._extra_ids)
+
+    def __contains__(self, node_id):
+        return node_id in self.index_map
+
+    def index(self, node_id):
+        """Return the index of a node id, or -1 if it was never interned"""
+        return self.index_map.get(node_id, -1)
+
+    def intern(self, node_id, node_type=None, name=''):
+        """Return the index of a node id, appending it if it is new"""
+        idx = self.index_map.get(node_id, -1)
+        if idx < 0:
+            idx = len(self)
+            self._extra_ids.append(node_id)
+            self._extra_types.append(node_type)
+            self._extra_names.append(name)
+            self.index_map[node_id] = idx
+        return idx
+
+    def intern_many(self, node_ids, node_type=None):
+        """Vectorized intern of an array of ids, returning an int32 index array"""
+        codes, uniques = pd.factorize(np.asarray(node_ids, dtype=object))
+        lookup = np.array([self.intern(u, node_type) for u in uniques], dtype=np.int32)
+        return lookup[codes] if len(codes) else np.zeros(0, dtype=np.int32)
+
+    def id_of(self, idx):
+        return self.ids[idx] if idx < self._base_size else self._extra_ids[idx - self._base_size]
+
+    def ids_of(self, indices):
+        return [self.id_of(i) for i in np.asarray(indices).tolist()]
+
+    def name_of(self, idx):
+        return self.names[idx] if idx < self._base_size else self._extra_names[idx - self._base_size]
+
+    def type_of(self, idx):
+        if idx < self._base_size:
+            code = self.type_codes[idx]
+            return self.type_names[code] if code != self.UNKNOWN_TYPE else 'unknown'
+        return self._extra_types[idx - self._base_size] or 'unknown'
+
+    def type_code(self, node_type):
+        """Return the uint8 code of a node type, or UNKNOWN_TYPE"""
+        return self.type_names.index(node_type) if node_type in self.type_names else self.UNKNOWN_TYPE
+
+
+class CSRGraphStore:
+    """Compressed sparse (CSR/CSC) storage for the explanation KG.
+
+    Every edge is stored exactly once, ordered by source node (CSR). The
+    in-adjacency (CSC) is a permutation of edge ids ordered by target node,
+    so relation codes and attention scores are never duplicated.
+
+    Within each node, both orders are further sorted by relation and then by
+    descending combined attention (layer1_att + layer2_att). Every
+    (node, relation, direction) is therefore a contiguous segment whose
+    prefix holds its most attended edges. The *_seg arrays index these
+    segments, and *_by_att1 hold each node's edges by descending layer1_att.
+    """
+
+    ARRAYS = ['src', 'dst', 'rel', 'layer1_att', 'layer2_att', 'out_indptr', 'in_eids', 'in_indptr',
+              'out_seg_indptr', 'out_seg_rel', 'out_node_seg', 'out_by_att1',
+              'in_seg_indptr', 'in_seg_rel', 'in_node_seg', 'in_by_att1']
+
+    def __init__(self, nodes, relations, arrays):
+        self.nodes = nodes
+        self.relations = list(relations)
+        self.relation_index = {r: i for i, r in enumerate(self.relations)}
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_edges(cls, nodes, relations, src, dst, rel, layer1_att, layer2_att):
+        """Build the CSR/CSC arrays from unordered edge columns"""
+        num_nodes = len(nodes)
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+
+        # CSR: edges sorted by source node, relation and descending attention
+        combined = np.asarray(layer1_att, dtype=np.float32) + np.asarray(layer2_att, dtype=np.float32)
+        rel = np.asarray(rel, dtype=np.int16)
+        order = np.lexsort((-combined, rel, src))
+        arrays = {
+            'src': src[order],
+            'dst': dst[order],
+            'rel': rel[order],
+            'layer1_att': np.asarray(layer1_att, dtype=np.float32)[order],
+            'layer2_att': np.asarray(layer2_att, dtype=np.float32)[order],
+        }
+        arrays['out_indptr'] = cls._indptr(arrays['src'], num_nodes)
+
+        # CSC: edge ids sorted by target node, relation and descending attention
+        combined = combined[order]
+        arrays['in_eids'] = np.lexsort((-combined, arrays['rel'], arrays['dst'])).astype(np.int32)
+        arrays['in_indptr'] = cls._indptr(arrays['dst'], num_nodes)
+
+        # (node, relation) segments of both orders
+        (arrays['out_seg_indptr'], arrays['out_seg_rel'],
+         arrays['out_node_seg']) = cls._segments(arrays['src'], arrays['rel'], num_nodes)
+        in_eids = arrays['in_eids']
+        (arrays['in_seg_indptr'], arrays['in_seg_rel'],
+         arrays['in_node_seg']) = cls._segments(arrays['dst'][in_eids], arrays['rel'][in_eids], num_nodes)
+
+        # Edge ids of each node by descending layer1_att, aligned with out_indptr/in_indptr
+        neg_att1 = -arrays['layer1_att']
+        arrays['out_by_att1'] = np.lexsort((neg_att1, arrays['src'])).astype(np.int32)
+        arrays['in_by_att1'] = np.lexsort((neg_att1, arrays['dst'])).astype(np.int32)
+        return cls(nodes, relations, arrays)
+
+    @classmethod
+    def _segments(cls, node_keys, rel_keys, num_nodes):
+        """Find the runs of equal (node, relation) in edge arrays sorted by both
+
+        :return: (segment start offsets + end, relation of each segment,
+            node -> segment range indptr)
+        """
+        if len(node_keys):
+            changes = np.flatnonzero((np.diff(node_keys) != 0) | (np.diff(rel_keys) != 0)) + 1
+            starts = np.concatenate([[0], changes])
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+        seg_indptr = np.append(starts, len(node_keys)).astype(np.int64)
+        seg_rel = np.asarray(rel_keys)[starts].astype(np.int16)
+        node_seg = cls._indptr(np.asarray(node_keys)[starts], num_nodes)
+        return seg_indptr, seg_rel, node_seg
+
+    @classmethod
+    def empty(cls):
+        return cls.from_edges(NodeDictionary.empty(), [], [], [], [], [], [])
+
+    @staticmethod
+    def _indptr(keys, num_nodes):
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_nodes), out=indptr[1:])
+        return indptr
+
+    @property
+    def num_nodes(self):
+        return len(self.out_indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def __contains__(self, node_id):
+        return self.index_of(node_id) >= 0
+
+    def index_of(self, node_id):
+        """Return the integer index of a graph node id, or -1 if it is not in the graph"""
+        idx = self.nodes.index(node_id)
+        return idx if idx < self.num_nodes else -1
+
+    def relation_code(self, relation):
+        """Return the integer code of a relation name, or -1 if it is unknown"""
+        return self.relation_index.get(relation, -1)
+
+    def out_edge_ids(self, idx):
+        return np.arange(self.out_indptr[idx], self.out_indptr[idx + 1])
+
+    def in_edge_ids(self, idx):
+        return self.in_eids[self.in_indptr[idx]:self.in_indptr[idx + 1]]
+
+    def edge_ids(self, idx, incoming):
+        return self.in_edge_ids(idx) if incoming else self.out_edge_ids(idx)
+
+    def relation_top_edges(self, idx, incoming, k):
+        """Per relation of a node, in relation code order, its k most attended edge ids
+
+        :return: list of (relation code, edge id array)
+        """
+        if incoming:
+            seg_indptr, seg_rel, node_seg = self.in_seg_indptr, self.in_seg_rel, self.in_node_seg
+        else:
+            seg_indptr, seg_rel, node_seg = self.out_seg_indptr, self.out_seg_rel, self.out_node_seg
+        result = []
+        for s in range(node_seg[idx], node_seg[idx + 1]):
+            start = seg_indptr[s]
+            end = min(seg_indptr[s + 1], start + k)
+            eids = self.in_eids[start:end] if incoming else np.arange(start, end)
+            result.append((int(seg_rel[s]), eids))
+        return result
+
+    def top_edges_by_layer1(self, idx, incoming, k):
+        """The k edge ids of a node with the highest layer1_att"""
+        indptr, by_att1 = (self.in_indptr, self.in_by_att1) if incoming else (self.out_indptr, self.out_by_att1)
+        start = indptr[idx]
+        return by_att1[start:min(indptr[idx + 1], start + k)]
+
+    def neighbors(self, eids, incoming):
+        """Return the node at the far end of each edge"""
+        return self.src[eids] if incoming else self.dst[eids]
+
+    def edge_data(self, eid):
+        """Edge attributes in the format of the former networkx edge dicts"""
+        relation = self.relations[self.rel[eid]]
+        return {
+            'type': relation,
+            'layer1_att': self.layer1_att[eid],
+            'layer2_att': self.layer2_att[eid],
+            'edge_info': relation
+        }
+
+    def warm(self):
+        """Touch every page of the (possibly memory-mapped) arrays so queries do not fault"""
+        page = 4096
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            if array.nbytes:
+                int(array.reshape(-1).view(np.uint8)[::page].sum())
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def convert2str(x):
+    """Float-normalize an id unless it is a merged id (same as convert2str in DRGNN utils)"""
+    try:
+        if '_' not in str(x):
+            x = float(x)
+    except (TypeError, ValueError):
+        pass
+    return str(x)
+
+
+def id_forms(node_id):
+    """Alternative spellings of an id, most specific first
+
+    :return: list of (form, priority); lower priorities win on conflicts
+    """
+    forms = [(node_id, 0), (convert2str(node_id), 1)]
+    # Merged ids like "20108_16450_19532" stand for each of their components
+    if '_' in node_id:
+        for part in node_id.split('_'):
+            forms.append((part, 2))
+            forms.append((convert2str(part), 2))
+    # Former fallback: ids that agree before the first '.'
+    forms.append((node_id.split('.')[0], 3))
+    return forms
+
+
+class IdResolver:
+    """O(1) resolution of raw, float-formatted and merged ids to node indices
+
+    Built once over a set of candidate nodes. Queries are tried as given and
+    float-normalized, and a candidate's own spelling beats a component of a
+    merged id ("16450" is "16450.0" even if "20108_16450_19532" exists); ids
+    that resolve to nothing are remembered in a bounded negative cache.
+    """
+
+    def __init__(self, nodes, candidates, negative_cache_size=100000):
+        self.nodes = nodes
+        self.lookup = {}
+        self.priorities = {}
+        for idx, node_id in zip(candidates.tolist(), nodes.ids_of(candidates)):
+            for form, priority in id_forms(node_id):
+                if priority < self.priorities.get(form, 4):
+                    self.lookup[form] = idx
+                    self.priorities[form] = priority
+        self.negative_cache_size = negative_cache_size
+        self.unknown = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def empty(cls, nodes):
+        return cls(nodes, np.zeros(0, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.lookup)
+
+    def resolve(self, node_id):
+        """Node index of the candidate an id refers to, or -1"""
+        if not isinstance(node_id, str) or not node_id:
+            return -1
+        idx = self.lookup.get(node_id)
+        # An id or its float-normalized spelling
+        if idx is not None and self.priorities[node_id] <= 1:
+            return idx
+        if node_id in self.unknown:
+            return -1
+
+        for form in (convert2str(node_id), node_id, node_id.split('.')[0]):
+            idx = self.lookup.get(form)
+            if idx is not None:
+                return idx
+
+        with self._lock:
+            self.unknown[node_id] = True
+            if len(self.unknown) > self.negative_cache_size:
+                self.unknown.popitem(last=False)
+        return -1
+
+    def resolve_many(self, node_ids):
+        """Resolve a batch of ids into an int array of node indices (-1 where unknown)"""
+        return np.array([self.resolve(node_id) for node_id in node_ids], dtype=np.int64)
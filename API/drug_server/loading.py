@@ -0,0 +1,66 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DataNotReady(Exception):
+    """Raised when a query needs data whose loading stage has not finished"""
+
+    def __init__(self, stage, status):
+        super().__init__(f"data for stage '{stage}' is not ready ({status})")
+        self.stage = stage
+        self.status = status
+
+
+class LoadStages:
+    """Progress and timings of the staged database load, for readiness checks"""
+
+    PENDING, LOADING, READY, FAILED = 'pending', 'loading', 'ready', 'failed'
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._stages = {name: {'status': self.PENDING, 'started': None, 'seconds': None, 'error': None}
+                        for name in self.names}
+
+    def run(self, name, fn):
+        """Run one loading stage, recording its status and duration"""
+        with self._lock:
+            self._stages[name].update(status=self.LOADING, started=time.time())
+        start_time = time.time()
+        try:
+            fn()
+            status, error = self.READY, None
+        except Exception as e:
+            logger.exception(f"Loading stage '{name}' raised")
+            status, error = self.FAILED, str(e)
+        with self._lock:
+            self._stages[name].update(status=status, seconds=round(time.time() - start_time, 3), error=error)
+            if all(s['status'] in (self.READY, self.FAILED) for s in self._stages.values()):
+                self._done.set()
+        logger.info(f"Loading stage '{name}' {status} in {time.time() - start_time:.2f} seconds")
+
+    def is_ready(self, name):
+        return self._stages[name]['status'] == self.READY
+
+    @property
+    def all_ready(self):
+        return all(self.is_ready(name) for name in self.names)
+
+    def require(self, *names):
+        """Raise DataNotReady unless every named stage is ready"""
+        for name in names:
+            status = self._stages[name]['status']
+            if status != self.READY:
+                raise DataNotReady(name, status)
+
+    def wait(self, timeout=None):
+        """Block until every stage has finished (successfully or not)"""
+        return self._done.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            return {name: dict(self._stages[name]) for name in self.names}
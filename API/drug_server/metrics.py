@@ -0,0 +1,143 @@
+import time
+import bisect
+import functools
+import threading
+
+# Seconds, from a cache hit to a slow path search
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes, from an error message to a full disease list
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, last is +Inf), sum]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][i] += 1
+            counts[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metrics of this process in the Prometheus text exposition format
+
+    Collectors are called at scrape time and return (name, type, help, value)
+    tuples, for values owned by other objects such as the result cache.
+    Registering a collector again under the same name replaces it.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = {}
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, collector):
+        self.collectors[name] = collector
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in list(self.collectors.values()):
+            for name, kind, help, value in collector():
+                lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'drug_server_http_requests_total', 'HTTP requests by endpoint, method and status',
+    ('endpoint', 'method', 'status'))
+HTTP_SECONDS = REGISTRY.histogram(
+    'drug_server_http_request_duration_seconds', 'Time to build the response of an HTTP request',
+    ('endpoint', 'method'))
+HTTP_BYTES = REGISTRY.histogram(
+    'drug_server_http_response_bytes', 'Size of non-streamed response bodies',
+    ('endpoint',), buckets=SIZE_BUCKETS)
+DB_SECONDS = REGISTRY.histogram(
+    'drug_server_db_query_duration_seconds', 'Time spent in database query methods', ('method',))
+DB_ERRORS = REGISTRY.counter(
+    'drug_server_db_query_errors_total', 'Database query methods that raised, by exception type',
+    ('method', 'error'))
+
+
+def timed(fn):
+    """Record the duration and exceptions of a database method"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            DB_ERRORS.inc(method=fn.__name__, error=type(e).__name__)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - start_time, method=fn.__name__)
+    return wrapper
@@ -0,0 +1,110 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from graph_store import StringTable
+from snapshot import save_string_table, open_string_table
+
+PREDICTIONS_DIR = 'predictions_snapshot'
+
+
+class PredictionStore:
+    """Drug predictions grouped by disease, pre-filtered and pre-sorted.
+
+    Diseases and drugs are interned node indices. The disease in slot s owns
+    the contiguous slice indptr[s]:indptr[s + 1] of the drug_idx/scores
+    arrays, sorted by descending score, so the top-N drugs of a disease are a
+    plain slice. Scores stay float64 so that responses keep the precision of
+    the CSV.
+    """
+
+    def __init__(self, disease_nodes, indptr, drug_idx, scores, num_rows=0):
+        self.num_rows = num_rows
+        self.disease_nodes = disease_nodes
+        self.slot_of = {d: s for s, d in enumerate(disease_nodes.tolist())}
+        self.indptr = indptr
+        self.drug_idx = drug_idx
+        self.scores = scores
+
+    @classmethod
+    def from_csv(cls, path, nodes, drug_indications=None):
+        """Build the store from filtered_predictions.csv
+
+        :param nodes: NodeDictionary used to intern disease and drug ids
+        :param drug_indications: if given, only drugs whose node index is in this array are kept
+        """
+        df = pd.read_csv(path, usecols=['disease_id', 'drug_id', 'score'],
+                         dtype={'disease_id': 'string', 'drug_id': 'string', 'score': np.float64})
+        df = df.dropna(subset=['disease_id', 'drug_id'])
+        disease_idx = nodes.intern_many(df['disease_id'].to_numpy(dtype=object), 'disease')
+        drug_idx = nodes.intern_many(df['drug_id'].to_numpy(dtype=object), 'drug')
+        scores = df['score'].to_numpy(dtype=np.float64)
+
+        # Diseases get a slot before filtering so that diseases without any
+        # remaining drug still resolve (to an empty slice)
+        slots, disease_nodes = pd.factorize(disease_idx)
+
+        keep = ~df.duplicated(['disease_id', 'drug_id'], keep='last').to_numpy()
+        if drug_indications is not None:
+            keep &= np.isin(drug_idx, drug_indications)
+        slots, drug_idx, scores = slots[keep], drug_idx[keep], scores[keep]
+
+        order = np.lexsort((-scores, slots))
+        indptr = np.zeros(len(disease_nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(slots, minlength=len(disease_nodes)), out=indptr[1:])
+
+        return cls(np.asarray(disease_nodes, dtype=np.int32), indptr,
+                   drug_idx[order], scores[order], num_rows=len(df))
+
+    def save(self, path, nodes):
+        """Persist the store with ids as strings, since node indices are per process"""
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        drug_codes, drug_nodes = pd.factorize(self.drug_idx)
+        save_string_table(tmp_path, 'disease_ids', StringTable.from_strings(nodes.ids_of(self.disease_nodes)))
+        save_string_table(tmp_path, 'drug_ids', StringTable.from_strings(nodes.ids_of(drug_nodes)))
+        np.save(os.path.join(tmp_path, 'drug_codes.npy'), drug_codes.astype(np.int32))
+        np.save(os.path.join(tmp_path, 'indptr.npy'), self.indptr)
+        np.save(os.path.join(tmp_path, 'scores.npy'), self.scores)
+        np.save(os.path.join(tmp_path, 'num_rows.npy'), np.array([self.num_rows]))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path, nodes):
+        """Open a store written by save(), interning its ids into nodes"""
+        disease_nodes = nodes.intern_many(list(open_string_table(path, 'disease_ids')), 'disease')
+        drug_nodes = nodes.intern_many(list(open_string_table(path, 'drug_ids')), 'drug')
+        drug_codes = np.load(os.path.join(path, 'drug_codes.npy'))
+        scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        if scores.dtype != np.float64:
+            raise ValueError(f"scores stored as {scores.dtype}, rebuilding for float64")
+        return cls(disease_nodes, np.load(os.path.join(path, 'indptr.npy')),
+                   drug_nodes[drug_codes] if len(drug_codes) else np.zeros(0, dtype=np.int32),
+                   scores,
+                   num_rows=int(np.load(os.path.join(path, 'num_rows.npy'))[0]))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64),
+                   np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.disease_nodes)
+
+    def __contains__(self, disease):
+        return disease in self.slot_of
+
+    def count(self, disease):
+        s = self.slot_of[disease]
+        return int(self.indptr[s + 1] - self.indptr[s])
+
+    def top(self, disease, n):
+        """Return (drug_idx, scores) of the n best drugs for a disease node"""
+        s = self.slot_of[disease]
+        start = self.indptr[s]
+        end = min(self.indptr[s + 1], start + n)
+        return self.drug_idx[start:end], self.scores[start:end]
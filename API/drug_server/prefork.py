@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PR_SET_PDEATHSIG = 1
+
+
+def exit_with_parent(parent_pid, interval=1.0):
+    """End this forked worker when the process that forked it dies, even by SIGKILL
+
+    On Linux the kernel sends SIGTERM (prctl PR_SET_PDEATHSIG); elsewhere a
+    watchdog thread polls os.getppid().
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM, 0, 0, 0) == 0:
+                # The parent may have died before prctl
+                if os.getppid() != parent_pid:
+                    os._exit(0)
+                return
+        except (OSError, AttributeError):
+            pass
+
+    def watchdog():
+        while os.getppid() == parent_pid:
+            time.sleep(interval)
+        os._exit(0)
+    threading.Thread(target=watchdog, name='parent-watchdog', daemon=True).start()
+
+
+def serve(server, workers):
+    """Run server.serve_forever in this process and workers - 1 forked copies
+
+    The copies accept on the same socket. SIGTERM or SIGINT to this process
+    is passed on to every copy, which are waited for before it returns.
+    """
+    parent_pid = os.getpid()
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_with_parent(parent_pid)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    received = []
+
+    def stop(signum, frame):
+        received.append(signum)
+        raise SystemExit(128 + signum)
+
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+    logger.info(f"Serving on {server.server_address} with {workers} forked workers: {[parent_pid] + children}")
+    try:
+        server.serve_forever()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        sig = received[0] if received else signal.SIGTERM
+        for pid in children:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        server.server_close()
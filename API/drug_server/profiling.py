@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# The profile of the request handled by the current thread, if any
+_local = threading.local()
+
+
+class RequestProfile:
+    """Sampled stacks and phase timings of one request
+
+    A sampler thread records the stacks of the request thread, and of the
+    worker threads running its sub-queries (see propagate), every `interval`
+    seconds. Stacks are written in the collapsed format read by flamegraph.pl
+    and speedscope, phase timings and request details as JSON next to them.
+    """
+
+    def __init__(self, directory, label, interval=0.005):
+        self.directory = directory
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}.{int(time.time() * 1000) % 1000:03d}-{os.getpid()}-{threading.get_ident()}-" \
+                    f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'root'}"
+        self.interval = interval
+        self.threads = {threading.get_ident(): 'request'}
+        self.phases = {}
+        self.stacks = Counter()
+        self.samples = 0
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self.threads.items())
+            for ident, root in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if stack:
+                    stack.append(root)
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def add_thread(self, ident, root):
+        with self._lock:
+            self.threads[ident] = root
+
+    def remove_thread(self, ident):
+        with self._lock:
+            self.threads.pop(ident, None)
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def stop(self, **details):
+        """Stop sampling and write {name}.folded and {name}.json to the profile directory"""
+        seconds = time.perf_counter() - self.start_time
+        with self._lock:
+            self.threads.clear()
+        self._stop.set()
+        self._sampler.join()
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.name)
+        with open(f'{path}.folded', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        with open(f'{path}.json', 'w') as f:
+            json.dump({
+                **details,
+                'seconds': round(seconds, 6),
+                'phases': {name: round(s, 6) for name, s in self.phases.items()},
+                'samples': self.samples,
+                'interval': self.interval,
+                'stacks': f'{self.name}.folded',
+            }, f, indent=2)
+        return path
+
+
+def start(directory, label, interval=0.005):
+    """Profile the request handled by the current thread until finish()"""
+    profile = _local.profile = RequestProfile(directory, label, interval)
+    return profile
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def finish(**details):
+    """Stop the profile of the current thread, if any, and return the path of its files"""
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    return profile.stop(**details)
+
+
+@contextmanager
+def phase(name):
+    """Time a phase (load, query, serialize) of the profiled request; a no-op otherwise"""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - start_time)
+
+
+def propagate(fn):
+    """Wrap fn, submitted to a worker thread, so that the worker is sampled as part of the current profile"""
+    profile = current()
+    if profile is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        profile.add_thread(ident, threading.current_thread().name)
+        _local.profile = profile
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.profile = None
+            profile.remove_thread(ident)
+    return wrapper
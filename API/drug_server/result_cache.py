@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the JSON of a cached endpoint changes, so that results stored
+# in RESULT_CACHE_DIR by older code are not served
+RESULT_FORMAT_VERSION = 2
+
+
+def result_version(data_version, settings):
+    """Version part of result cache keys: the loaded data, the result format and
+    the settings that shape results, such as the path search limits"""
+    blob = json.dumps({'data': data_version, 'format': RESULT_FORMAT_VERSION, 'settings': settings},
+                      sort_keys=True)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache:
+    """Serialized JSON responses, evicted least-recently-used by total size.
+
+    Keys are tuples of (endpoint, normalized args, result_version), so results
+    of an older data build, result format or settings are never served; they
+    age out of the LRU.
+    With `disk_path`, entries are also written there and reloaded on a
+    memory miss, so they survive restarts. Files are pruned oldest first (by
+    last write or hit) to `max_disk_bytes`, at start and whenever a write
+    goes over, so entries of older data versions are removed first.
+    """
+
+    def __init__(self, max_bytes, disk_path=None, max_disk_bytes=1024 * 2**20):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.hits = self.misses = self.evictions = self.disk_hits = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+            self.prune_disk(max_disk_bytes)
+
+    @classmethod
+    def from_config(cls, config):
+        max_bytes = config.get('RESULT_CACHE_BYTES', 0)
+        if not max_bytes:
+            return None
+        return cls(max_bytes, config.get('RESULT_CACHE_DIR'),
+                   config.get('RESULT_CACHE_DISK_BYTES', 1024 * 2**20))
+
+    def _file(self, key):
+        return os.path.join(self.disk_path, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        with self._lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return body
+
+        if self.disk_path:
+            path = self._file(key)
+            try:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                os.utime(path)
+            except OSError:
+                body = None
+            if body is not None:
+                self._insert(key, body)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return body
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, body):
+        self._insert(key, body)
+        if self.disk_path:
+            path = self._file(key)
+            tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Error writing result cache entry {path}: {e}")
+                return
+            with self._disk_lock:
+                self.disk_size += len(body)
+                over = self.disk_size > self.max_disk_bytes
+            if over:
+                # Prune below the limit, so that not every following write rescans the directory
+                self.prune_disk(self.max_disk_bytes * 0.9)
+
+    def prune_disk(self, limit):
+        """Delete the least recently used files of disk_path until at most limit bytes remain"""
+        with self._disk_lock:
+            files = []
+            for entry in os.scandir(self.disk_path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                # Leftovers of interrupted writes
+                if '.tmp-' in entry.name:
+                    if stat.st_mtime < time.time() - 3600:
+                        self._remove(entry.path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for _, size, path in files:
+                if total <= limit:
+                    break
+                if self._remove(path):
+                    total -= size
+                    removed += 1
+            self.disk_size = total
+        if removed:
+            logger.info(f"Pruned {removed} result cache files, {total / 2**20:.1f} MB left in {self.disk_path}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _insert(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_hits': self.disk_hits,
+                'disk_bytes': self.disk_size,
+            }
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+
+from graph_store import CSRGraphStore, NodeDictionary, StringTable
+
+# Bump whenever the on-disk layout changes; older snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DIR = 'graph_snapshot'
+META_FILE = 'meta.json'
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def save_string_table(path, name, table):
+    np.save(os.path.join(path, f'{name}.offsets.npy'), table.offsets)
+    np.save(os.path.join(path, f'{name}.data.npy'), table.buffer)
+
+
+def open_string_table(path, name):
+    return StringTable(
+        np.load(os.path.join(path, f'{name}.offsets.npy'), mmap_mode='r'),
+        np.load(os.path.join(path, f'{name}.data.npy'), mmap_mode='r')
+    )
+
+
+def write_snapshot(path, graph):
+    """Write the graph and its node dictionary as raw arrays plus string tables
+
+    The directory is written next to its final location and renamed into
+    place, so readers never observe a half-written snapshot.
+    """
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name in CSRGraphStore.ARRAYS:
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(getattr(graph, name)))
+
+    # Only the graph nodes are persisted; ids interned later are rebuilt on load
+    nodes = graph.nodes
+    np.save(os.path.join(tmp_path, 'node_types.npy'), np.ascontiguousarray(nodes.type_codes[:graph.num_nodes]))
+    save_string_table(tmp_path, 'node_ids', nodes.ids)
+    save_string_table(tmp_path, 'node_names', nodes.names)
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'created': time.time(),
+        'num_nodes': graph.num_nodes,
+        'num_edges': graph.num_edges,
+        'relations': list(graph.relations),
+        'node_types': nodes.type_names,
+    }
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def open_snapshot(path):
+    """Memory-map a snapshot written by write_snapshot into a CSRGraphStore"""
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        raise SnapshotError(f"no snapshot at {path}")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"snapshot version {meta.get('version')} != {SNAPSHOT_VERSION}")
+
+    nodes = NodeDictionary(
+        open_string_table(path, 'node_ids'),
+        np.load(os.path.join(path, 'node_types.npy'), mmap_mode='r'),
+        meta['node_types'],
+        open_string_table(path, 'node_names')
+    )
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+              for name in CSRGraphStore.ARRAYS}
+    graph = CSRGraphStore(nodes, meta['relations'], arrays)
+    if len(nodes) != meta['num_nodes'] or graph.num_nodes != meta['num_nodes'] \
+            or graph.num_edges != meta['num_edges']:
+        raise SnapshotError("snapshot arrays do not match its metadata")
+    return graph
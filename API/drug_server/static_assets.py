@@ -0,0 +1,120 @@
+import os
+import gzip
+import json
+import logging
+import argparse
+import mimetypes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from build_cache import MANIFEST_FILE, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+STATIC_CACHE_DIR = 'static_cache'
+INDEX_FILE = 'index.json'
+
+# Files of the data folder served with precompressed variants
+COMPRESSIBLE = ('.json',)
+
+# Content-Encoding -> (sidecar suffix, compressor), in order of preference
+ENCODINGS = {'gzip': ('gz', lambda data: gzip.compress(data, 9, mtime=0))}
+if brotli is not None:
+    ENCODINGS = {'br': ('br', lambda data: brotli.compress(data, quality=9)), **ENCODINGS}
+
+
+class StaticAsset:
+    def __init__(self, path, etag, variants):
+        self.path = path
+        self.etag = etag
+        self.variants = variants
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def encoding_for(self, accept_encodings):
+        """Best precompressed encoding the client accepts, or None for the plain file"""
+        for encoding in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+
+class StaticDataIndex:
+    """Content-hash ETags and compressed sidecars for the files of the data folder
+
+    Sidecars are named after the content hash of their source and kept in
+    STATIC_CACHE_DIR, so they are only recompressed after a file changed.
+    """
+
+    def __init__(self, folder, max_bytes=256 * 2**20):
+        self.folder = folder
+        self.cache_path = os.path.join(folder, STATIC_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.assets = {}
+
+    def build(self):
+        index_path = os.path.join(self.cache_path, INDEX_FILE)
+        try:
+            with open(index_path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        fingerprints, keep = {}, {INDEX_FILE}
+        for name in sorted(os.listdir(self.folder)):
+            path = os.path.join(self.folder, name)
+            if not name.endswith(COMPRESSIBLE) or name == MANIFEST_FILE or not os.path.isfile(path) \
+                    or os.path.getsize(path) > self.max_bytes:
+                continue
+            fingerprint = file_fingerprint(path, previous.get(name))
+            fingerprints[name] = fingerprint
+            etag = fingerprint['sha256'][:20]
+
+            variants = {}
+            for encoding, (suffix, compress) in ENCODINGS.items():
+                sidecar = os.path.join(self.cache_path, f'{name}.{etag}.{suffix}')
+                if not os.path.exists(sidecar):
+                    with open(path, 'rb') as f:
+                        data = compress(f.read())
+                    if len(data) >= fingerprint['size']:
+                        continue
+                    tmp_path = f'{sidecar}.tmp-{os.getpid()}'
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, sidecar)
+                variants[encoding] = sidecar
+                keep.add(os.path.basename(sidecar))
+            self.assets[name] = StaticAsset(path, etag, variants)
+
+        # Sidecars of older file versions
+        for name in os.listdir(self.cache_path):
+            path = os.path.join(self.cache_path, name)
+            if name not in keep and os.path.isfile(path):
+                os.remove(path)
+        tmp_path = f'{index_path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(fingerprints, f, indent=2)
+        os.replace(tmp_path, index_path)
+        logger.info(f"Indexed {len(self.assets)} static data files with "
+                    f"{sum(len(a.variants) for a in self.assets.values())} precompressed variants")
+        return self
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def versioned_urls(self, prefix):
+        """URLs that change with the file content and can be cached forever"""
+        return {name: f'{prefix}/{name}?v={asset.etag}' for name, asset in self.assets.items()}
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Build compressed sidecars of the static data files')
+    parser.add_argument('--data', default=Config.DATA_FOLDER, help='Data folder (txgnn_data_v2)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    StaticDataIndex(args.data).build()
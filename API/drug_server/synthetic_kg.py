@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Share of each node type, roughly as in PrimeKG
+NODE_TYPE_SHARES = {
+    'anatomy': 0.108,
+    'biological_process': 0.221,
+    'cellular_component': 0.032,
+    'disease': 0.132,
+    'drug': 0.062,
+    'effect/phenotype': 0.118,
+    'exposure': 0.006,
+    'gene/protein': 0.214,
+    'molecular_function': 0.086,
+    'pathway': 0.021,
+}
+
+# Relations that dominate the attention output, relative to share(x) * share(y)
+RELATION_BOOST = {'protein_protein': 4.0, 'disease_protein': 3.0, 'drug_targets': 3.0,
+                  'indication': 8.0, 'disease_phenotype': 2.0}
+
+# Every 25th disease gets a merged id like "120_50120", as in the TxGNN disease groups
+MERGED_DISEASE_EVERY = 25
+
+
+def zipf_weights(n, skew, rng):
+    """Popularity of n nodes following a power law, in random node order"""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return rng.permutation(weights / weights.sum())
+
+
+def make_nodes(num_nodes, type_names):
+    """Ids, names and types of num_nodes nodes, split across types by NODE_TYPE_SHARES
+
+    :return: (ids, names, types, first node index per type, node count per type)
+    """
+    shares = np.array([NODE_TYPE_SHARES.get(t, 0.01) for t in type_names])
+    counts = np.maximum(np.round(shares / shares.sum() * num_nodes).astype(np.int64), 1)
+    types = np.repeat(np.array(type_names, dtype=object), counts)
+    total = len(types)
+
+    ids, names = [], []
+    for g, node_type in enumerate(types.tolist()):
+        if node_type == 'drug':
+            ids.append(f'DB{g:05d}')
+        elif node_type == 'disease':
+            ids.append(f'{g}_{total + g}' if g % MERGED_DISEASE_EVERY == 0 else f'{g}.0')
+        else:
+            ids.append(str(g))
+        names.append(f'{node_type} {g}')
+    starts = dict(zip(type_names, np.concatenate([[0], np.cumsum(counts)[:-1]]).tolist()))
+    counts = dict(zip(type_names, counts.tolist()))
+    return np.array(ids, dtype=object), np.array(names, dtype=object), types, starts, counts
+
+
+def relation_types(edge_types):
+    """(relation, x_type, y_type) of every relation and its reverse"""
+    relations = []
+    for relation, info in edge_types.items():
+        x_type, y_type = info['nodes']
+        # rev_indication runs from the drug to the disease it treats (see index_diseases)
+        if (x_type, y_type) == ('drug', 'disease'):
+            x_type, y_type = y_type, x_type
+        relations.append((relation, x_type, y_type))
+        relations.append((f'rev_{relation}', y_type, x_type))
+    return relations
+
+
+def generate(out_path, num_nodes=20000, num_edges=200000, predictions_per_disease=100, skew=1.0,
+             seed=0, types_path=None):
+    """Write a synthetic graphmask_output_indication.csv, filtered_predictions.csv and
+    drug_indication_subset.pkl to out_path
+
+    Node degrees follow a power law with exponent `skew` within each type, so
+    a few hubs collect most edges, as proteins and common diseases do in the
+    real graph.
+    """
+    from config import Config
+
+    types_path = types_path or Config.DATA_FOLDER
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(types_path, 'node_types.json')) as f:
+        type_names = json.load(f)
+    with open(os.path.join(types_path, 'edge_types.json')) as f:
+        edge_types = json.load(f)
+    os.makedirs(out_path, exist_ok=True)
+    for name in ('node_types.json', 'edge_types.json'):
+        shutil.copy(os.path.join(types_path, name), os.path.join(out_path, name))
+
+    start_time = time.time()
+    ids, names, types, starts, counts = make_nodes(num_nodes, type_names)
+    popularity = {t: zipf_weights(counts[t], skew, rng) for t in type_names}
+
+    relations = [r for r in relation_types(edge_types) if r[1] in counts and r[2] in counts]
+    weights = np.array([NODE_TYPE_SHARES.get(x, 0.01) * NODE_TYPE_SHARES.get(y, 0.01)
+                        * RELATION_BOOST.get(r[4:] if r.startswith('rev_') else r, 1.0)
+                        for r, x, y in relations])
+    per_relation = rng.multinomial(num_edges, weights / weights.sum())
+
+    parts = []
+    for code, ((relation, x_type, y_type), m) in enumerate(zip(relations, per_relation.tolist())):
+        if m == 0:
+            continue
+        src = starts[x_type] + rng.choice(counts[x_type], m, p=popularity[x_type])
+        dst = starts[y_type] + rng.choice(counts[y_type], m, p=popularity[y_type])
+        keep = src != dst
+        parts.append(np.stack([np.full(keep.sum(), code), src[keep], dst[keep]], axis=1))
+    edges = np.unique(np.concatenate(parts), axis=0)
+    rng.shuffle(edges)
+    rel, src, dst = edges[:, 0], edges[:, 1], edges[:, 2]
+
+    relation_names = np.array([r for r, _, _ in relations], dtype=object)
+    pd.DataFrame({
+        'x_id': ids[src], 'x_type': types[src], 'x_name': names[src],
+        'y_id': ids[dst], 'y_type': types[dst], 'y_name': names[dst],
+        'relation': relation_names[rel],
+        # Most edges get little attention, a few get most of it
+        'layer1_att': rng.beta(0.3, 1.5, len(edges)).astype(np.float32),
+        'layer2_att': rng.beta(0.3, 1.5, len(edges)).astype(np.float32),
+    }).to_csv(os.path.join(out_path, 'graphmask_output_indication.csv'), index=False, float_format='%.6f')
+
+    # Top predicted drugs of every disease, best first
+    diseases = np.arange(starts['disease'], starts['disease'] + counts['disease'])
+    k = min(predictions_per_disease, counts['drug'])
+    drugs = np.concatenate([np.argsort(rng.random((len(chunk), counts['drug'])), axis=1)[:, :k]
+                            for chunk in np.array_split(diseases, max(len(diseases) // 1000, 1))])
+    drugs += starts['drug']
+    scores = -np.sort(-rng.beta(2, 5, (len(diseases), k)), axis=1)
+    pd.DataFrame({
+        'disease_id': ids[np.repeat(diseases, k)],
+        'drug_id': ids[drugs.ravel()],
+        'score': scores.ravel().astype(np.float32),
+    }).to_csv(os.path.join(out_path, 'filtered_predictions.csv'), index=False, float_format='%.6f')
+
+    # Drugs with at least one indication
+    is_indication = relation_names[rel] == 'rev_indication'
+    with open(os.path.join(out_path, 'drug_indication_subset.pkl'), 'wb') as f:
+        pickle.dump(ids[np.unique(src[is_indication])].tolist(), f)
+
+    summary = {'nodes': len(ids), 'edges': len(edges), 'relations': len(relations),
+               'diseases': len(diseases), 'drugs': counts['drug'], 'predictions': len(diseases) * k,
+               'skew': skew, 'seed': seed}
+    logger.info(f"Generated {summary['nodes']} nodes, {summary['edges']} edges and "
+                f"{summary['predictions']} predictions in {time.time() - start_time:.2f} seconds")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic TxGNN data folder for load tests and benchmarks')
+    parser.add_argument('out', help='Output data folder')
+    parser.add_argument('--nodes', default=20000, type=int)
+    parser.add_argument('--edges', default=200000, type=int, help='Edges to draw; duplicates and self-loops are dropped')
+    parser.add_argument('--predictions', default=100, type=int, help='Predicted drugs per disease')
+    parser.add_argument('--skew', default=1.0, type=float, help='Power-law exponent of node degrees within a type')
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--types', default=None, help='Folder with node_types.json and edge_types.json')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    generate(args.out, args.nodes, args.edges, args.predictions, args.skew, args.seed, args.types)
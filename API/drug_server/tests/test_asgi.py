@@ -0,0 +1,96 @@
+import time
+import asyncio
+import threading
+
+from flask import Flask, Response, jsonify, request
+
+from asgi import AsgiApp
+
+
+def make_app(gate=None, running=None):
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        with running['lock']:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        gate.wait(5)
+        with running['lock']:
+            running['now'] -= 1
+        return jsonify({'thread': threading.current_thread().name})
+
+    @app.route('/fast')
+    def fast():
+        return jsonify({'thread': threading.current_thread().name})
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return jsonify({'body': request.get_json(), 'args': request.args.to_dict(),
+                        'header': request.headers.get('X-Test')})
+
+    @app.route('/stream')
+    def stream():
+        return Response((b'x' * 1000 for _ in range(200)), mimetype='text/plain')
+
+    return app
+
+
+async def call(asgi_app, path, method='GET', body=b'', query=b'', headers=()):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(k.encode(), v.encode()) for k, v in headers], 'http_version': '1.1'}
+    await asgi_app(scope, receive, send)
+    start = sent[0]
+    assert start['type'] == 'http.response.start'
+    assert sent[-1].get('more_body', False) is False
+    return start['status'], dict(start['headers']), b''.join(m['body'] for m in sent[1:])
+
+
+def test_inline_and_offloaded_requests():
+    asgi_app = AsgiApp(make_app(), workers=2, inline_paths=['/fast'])
+
+    async def main():
+        return await call(asgi_app, '/fast'), await call(asgi_app, '/echo', 'POST', b'{"a": 1}', b'x=2',
+                                                          [('Content-Type', 'application/json'), ('X-Test', 'yes')])
+    (status, _, body), (echo_status, headers, echo) = asyncio.run(main())
+    asgi_app.close()
+    assert status == 200 and b'MainThread' in body
+    assert echo_status == 200 and headers[b'content-type'] == b'application/json'
+    assert b'"a":1' in echo.replace(b' ', b'') and b'"x":"2"' in echo.replace(b' ', b'') and b'yes' in echo
+
+
+def test_streamed_response_is_sent_in_chunks():
+    asgi_app = AsgiApp(make_app(), workers=2)
+    status, _, body = asyncio.run(call(asgi_app, '/stream'))
+    asgi_app.close()
+    assert status == 200 and body == b'x' * 200000
+
+
+def test_concurrency_limit_and_inline_requests_not_blocked():
+    gate = threading.Event()
+    running = {'now': 0, 'max': 0, 'lock': threading.Lock()}
+    asgi_app = AsgiApp(make_app(gate, running), workers=8, max_concurrency=3, inline_paths=['/fast'])
+
+    async def main():
+        slow = [asyncio.ensure_future(call(asgi_app, '/slow')) for _ in range(10)]
+        await asyncio.sleep(0.2)
+        start_time = time.perf_counter()
+        status, _, _ = await call(asgi_app, '/fast')
+        fast_seconds = time.perf_counter() - start_time
+        gate.set()
+        return status, fast_seconds, await asyncio.gather(*slow)
+
+    status, fast_seconds, slow = asyncio.run(main())
+    asgi_app.close()
+    assert status == 200 and fast_seconds < 1
+    assert all(s == 200 and b'asgi' in body for s, _, body in slow)
+    assert running['max'] == 3
@@ -0,0 +1,53 @@
+import numpy as np
+
+from graph_store import NodeDictionary
+from id_resolution import IdResolver, convert2str
+
+
+def make_resolver(ids):
+    nodes = NodeDictionary.from_lists(ids, ['disease'] * len(ids), ids)
+    return nodes, IdResolver(nodes, np.arange(len(ids), dtype=np.int32))
+
+
+def resolved_id(nodes, resolver, query):
+    idx = resolver.resolve(query)
+    return nodes.id_of(idx) if idx >= 0 else None
+
+
+def test_exact_and_float_normalized_ids():
+    nodes, resolver = make_resolver(['1687.0', 'DB00001', '5'])
+    assert resolved_id(nodes, resolver, '1687.0') == '1687.0'
+    assert resolved_id(nodes, resolver, '1687') == '1687.0'
+    assert resolved_id(nodes, resolver, '5') == '5'
+    assert resolved_id(nodes, resolver, 'DB00001') == 'DB00001'
+
+
+def test_merged_id_components():
+    nodes, resolver = make_resolver(['20108_16450_19532', '7.0'])
+    assert resolved_id(nodes, resolver, '20108_16450_19532') == '20108_16450_19532'
+    assert resolved_id(nodes, resolver, '19532') == '20108_16450_19532'
+    assert resolved_id(nodes, resolver, '19532.0') == '20108_16450_19532'
+
+
+def test_normalized_id_beats_merged_component():
+    # '16450' is both convert2str-equivalent to '16450.0' and a component of the merged id
+    nodes, resolver = make_resolver(['20108_16450_19532', '16450.0'])
+    assert convert2str('16450') == '16450.0'
+    assert resolved_id(nodes, resolver, '16450') == '16450.0'
+    assert resolved_id(nodes, resolver, '16450.0') == '16450.0'
+    assert resolved_id(nodes, resolver, '20108') == '20108_16450_19532'
+
+
+def test_unknown_ids_and_negative_cache():
+    nodes, resolver = make_resolver(['1.0'])
+    resolver.negative_cache_size = 2
+    for query in ['x', 'y', 'z']:
+        assert resolver.resolve(query) == -1
+    assert list(resolver.unknown) == ['y', 'z']
+    assert resolver.resolve('') == -1
+    assert resolver.resolve(None) == -1
+
+
+def test_resolve_many():
+    nodes, resolver = make_resolver(['1.0', '2.0'])
+    assert resolver.resolve_many(['2', 'missing', '1.0']).tolist() == [1, -1, 0]
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+from graph_loader import load_attention_graph
+from path_search import NOT_COOL_REL, KShortestPaths, bidirectional_paths, edge_scores
+from synthetic_kg import generate
+
+
+@pytest.fixture(scope='module')
+def graph(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('synthetic'))
+    generate(path, num_nodes=300, num_edges=3000, predictions_per_disease=5, seed=1)
+    return load_attention_graph(os.path.join(path, 'graphmask_output_indication.csv'))
+
+
+def simple_paths(graph, source, target, max_hops, allowed=None):
+    """Every simple path from source to target with at most max_hops edges, as edge id tuples"""
+    paths = []
+
+    def visit(node, eids, visited):
+        if node == target and eids:
+            paths.append(tuple(eids))
+            return
+        if len(eids) == max_hops:
+            return
+        for eid in graph.out_edge_ids(node).tolist():
+            neighbor = int(graph.dst[eid])
+            if neighbor in visited or (allowed is not None and not allowed[eid]):
+                continue
+            visit(neighbor, eids + [eid], visited | {neighbor})
+
+    visit(source, [], {source})
+    return paths
+
+
+def disease_drug_pairs(graph, count):
+    types = [graph.nodes.type_of(i) for i in range(graph.num_nodes)]
+    diseases = [i for i, t in enumerate(types) if t == 'disease']
+    drugs = [i for i, t in enumerate(types) if t == 'drug']
+    rng = np.random.default_rng(0)
+    return [(int(rng.choice(diseases)), int(rng.choice(drugs))) for _ in range(count)]
+
+
+def assert_path(graph, source, target, eids, max_hops):
+    nodes = [source] + graph.dst[eids].tolist()
+    assert graph.src[eids].tolist() == nodes[:-1]
+    assert nodes[-1] == target
+    assert len(set(nodes)) == len(nodes)
+    assert 1 <= len(eids) <= max_hops
+
+
+def test_yen_matches_brute_force(graph):
+    engine = KShortestPaths(graph)
+    checked = 0
+    for source, target in disease_drug_pairs(graph, 40):
+        paths, complete = engine.search(source, target, k=5, max_hops=3, time_budget=30.0)
+        assert complete
+        expected = sorted(float(engine.costs[list(eids)].sum())
+                          for eids in simple_paths(graph, source, target, 3, engine.allowed))[:5]
+        assert [cost for cost, _ in paths] == pytest.approx(expected)
+        for cost, eids in paths:
+            assert_path(graph, source, target, eids, 3)
+            assert engine.allowed[eids].all()
+            assert cost == pytest.approx(engine.costs[eids].sum())
+        checked += bool(expected)
+    assert checked >= 5
+
+
+def test_yen_skips_blacklisted_relations(graph):
+    engine = KShortestPaths(graph)
+    banned = {graph.relations.index(r) for r in NOT_COOL_REL if r in graph.relations}
+    for source, target in disease_drug_pairs(graph, 10):
+        paths, _ = engine.search(source, target, k=5, max_hops=3, time_budget=30.0)
+        for _, eids in paths:
+            assert not banned & set(graph.rel[eids].tolist())
+
+
+def test_bidirectional_paths_matches_brute_force(graph):
+    # Without pruning, the meet-in-the-middle join sees every path of up to max_hops edges
+    checked = 0
+    for source, target in disease_drug_pairs(graph, 40):
+        found = bidirectional_paths(graph, source, target, max_hops=3, node_budget=10**6,
+                                    width=10**6, paths_per_node=10**6, top_n=10)
+        expected = sorted((float(edge_scores(graph, list(eids)).mean())
+                           for eids in simple_paths(graph, source, target, 3)), reverse=True)[:10]
+        assert [score for score, _ in found] == pytest.approx(expected)
+        assert len({tuple(eids) for _, eids in found}) == len(found)
+        for score, eids in found:
+            assert_path(graph, source, target, eids, 3)
+            assert score == pytest.approx(edge_scores(graph, eids).mean())
+        checked += bool(expected)
+    assert checked >= 5
+
+
+def test_bidirectional_paths_respects_budget(graph):
+    for source, target in disease_drug_pairs(graph, 10):
+        found = bidirectional_paths(graph, source, target, max_hops=3, node_budget=4, top_n=5)
+        assert len(found) <= 5
+        for _, eids in found:
+            assert_path(graph, source, target, eids, 3)
+
+
+def test_yen_costs_are_normalized_log_attention(graph):
+    engine = KShortestPaths(graph)
+    attention = (graph.layer1_att.astype(np.float64) + graph.layer2_att) / edge_scores(graph, slice(None)).max()
+    assert engine.costs.dtype == np.float32
+    assert engine.costs == pytest.approx(-np.log(np.maximum(attention, 1e-9)), rel=1e-5, abs=1e-6)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='reads /proc')
+
+SERVER = '''
+import os
+import sys
+from werkzeug.serving import make_server
+import prefork
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+prefork.serve(make_server('127.0.0.1', 0, app, threaded=True), 3)
+'''
+
+
+def children_of(pid):
+    found = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # fields[0] is the state, fields[1] the parent pid
+        if int(fields[1]) == pid and fields[0] != 'Z':
+            found.append(int(name))
+    return found
+
+
+def is_running(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+def start_server():
+    parent = subprocess.Popen([sys.executable, '-c', SERVER],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.time() + 10
+    while len(children_of(parent.pid)) < 2:
+        assert time.time() < deadline and parent.poll() is None, 'workers did not start'
+        time.sleep(0.05)
+    return parent, children_of(parent.pid)
+
+
+def wait_gone(pids, timeout=10):
+    deadline = time.time() + timeout
+    while any(is_running(pid) for pid in pids) and time.time() < deadline:
+        time.sleep(0.05)
+    return [pid for pid in pids if is_running(pid)]
+
+
+@pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGINT])
+def test_signal_to_parent_stops_workers(signum):
+    parent, workers = start_server()
+    parent.send_signal(signum)
+    parent.wait(10)
+    assert wait_gone(workers) == []
+
+
+def test_workers_exit_when_parent_is_killed():
+    parent, workers = start_server()
+    parent.kill()
+    parent.wait(10)
+    assert wait_gone(workers) == []
@@ -0,0 +1,32 @@
+import result_cache
+from result_cache import ResultCache, result_version
+
+SETTINGS = {'path_max_hops': 3, 'path_node_budget': 2000, 'path_time_budget': 1.0,
+            'path_blacklist': ['anatomy_anatomy']}
+
+
+def test_disk_entries_survive_restart(tmp_path):
+    key = ('attention_pair', ('1.0', 'DB1'), result_version('data', SETTINGS))
+    ResultCache(2**20, str(tmp_path)).put(key, b'{}')
+    assert ResultCache(2**20, str(tmp_path)).get(key) == b'{}'
+
+
+def test_changed_settings_miss_the_cache(tmp_path):
+    args = ('1.0', 'DB1')
+    ResultCache(2**20, str(tmp_path)).put(('attention_pair', args, result_version('data', SETTINGS)), b'{}')
+
+    restarted = ResultCache(2**20, str(tmp_path))
+    for name, value in [('path_max_hops', 4), ('path_node_budget', 500), ('path_time_budget', 2.0),
+                        ('path_blacklist', [])]:
+        version = result_version('data', {**SETTINGS, name: value})
+        assert restarted.get(('attention_pair', args, version)) is None, name
+    assert restarted.get(('attention_pair', args, result_version('other data', SETTINGS))) is None
+    assert restarted.misses == 5
+
+
+def test_changed_result_format_misses_the_cache(tmp_path, monkeypatch):
+    key = ('drug_predictions', ('1.0', 200), result_version('data', SETTINGS))
+    ResultCache(2**20, str(tmp_path)).put(key, b'[]')
+    monkeypatch.setattr(result_cache, 'RESULT_FORMAT_VERSION', result_cache.RESULT_FORMAT_VERSION + 1)
+    key = ('drug_predictions', ('1.0', 200), result_version('data', SETTINGS))
+    assert ResultCache(2**20, str(tmp_path)).get(key) is None
@@ -0,0 +1,45 @@
+import os
+import json
+
+from flask import Flask
+
+from static_assets import STATIC_CACHE_DIR, StaticDataIndex
+from vis import vis
+
+
+def write_data(folder):
+    data = {'node_types': ['disease', 'drug'] * 500}
+    with open(os.path.join(folder, 'node_types.json'), 'w') as f:
+        json.dump(data, f)
+    return data
+
+
+def test_build_keeps_subdirectories_and_prunes_old_sidecars(tmp_path):
+    write_data(tmp_path)
+    cache = tmp_path / STATIC_CACHE_DIR
+    (cache / 'nested').mkdir(parents=True)
+    (cache / 'node_types.json.0123456789abcdef0123.gz').write_bytes(b'old')
+
+    index = StaticDataIndex(str(tmp_path)).build()
+    assert (cache / 'nested').is_dir()
+    assert not (cache / 'node_types.json.0123456789abcdef0123.gz').exists()
+    assert 'gzip' in index.get('node_types.json').variants
+
+
+def test_versioned_urls_are_immutable_and_revalidate(tmp_path):
+    data = write_data(tmp_path)
+    app = Flask(__name__)
+    app.config['DATA_FOLDER'] = str(tmp_path)
+    app.extensions['static_data'] = StaticDataIndex(str(tmp_path)).build()
+    app.register_blueprint(vis, url_prefix='/')
+    client = app.test_client()
+
+    url = client.get('/txgnn_data_v2.json').get_json()['node_types.json']
+    response = client.get(f'/{url}')
+    assert response.get_json() == data
+    assert 'immutable' in response.headers['Cache-Control']
+
+    plain = client.get('/txgnn_data_v2/node_types.json')
+    assert 'no-cache' in plain.headers['Cache-Control']
+    revalidated = client.get('/txgnn_data_v2/node_types.json', headers={'If-None-Match': plain.headers['ETag']})
+    assert revalidated.status_code == 304
@@ -3,6 +3,11 @@ try:
 except ImportError:
     import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import numpy as np
 
 
@@ -20,3 +25,40 @@ def better_json_encoder(base_encoder):
             return super(JSONEncoder, self).default(o)
 
     return JSONEncoder
+
+
+# Decimals kept of float32 values (scores and attention) in API responses
+FLOAT_DECIMALS = 3
+
+
+def round_floats(values):
+    """Round a float32 array in one step; returns a list of floats ready to serialize"""
+    return np.round(np.asarray(values, dtype=np.float64), FLOAT_DECIMALS).tolist()
+
+
+def _numpy_default(o):
+    # float32 scalars are rounded like better_json_encoder; arrays in bulk
+    if isinstance(o, np.float32):
+        return float(np.round(np.float64(o), FLOAT_DECIMALS))
+    if isinstance(o, np.ndarray):
+        return round_floats(o) if o.dtype == np.float32 else o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_stdlib(obj):
+    return json.dumps(obj, default=_numpy_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_orjson(obj):
+    return orjson.dumps(obj, default=_numpy_default)
+
+
+def get_dumps(name='auto'):
+    """JSON serializer to bytes: 'orjson', 'stdlib', or 'auto' for orjson when it is installed"""
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ImportError("JSON_SERIALIZER is 'orjson' but orjson is not installed")
+        return dumps_orjson
+    return dumps_stdlib
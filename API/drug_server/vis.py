@@ -1,4 +1,4 @@
-from flask import Blueprint, send_from_directory, safe_join, current_app
+from flask import Blueprint, send_from_directory, send_file, safe_join, current_app, request, jsonify
 
 vis = Blueprint('vis', __name__)
 
@@ -44,4 +44,34 @@ def send_data(path):
     '''
     # if path == 'node_name_dict.json':
     #     return send_from_directory(current_app.config['DATA_FOLDER'], f"{current_app.config['GNN']}_{path}")
-    return send_from_directory(current_app.config['DATA_FOLDER'], path)
+    static_data = current_app.extensions.get('static_data')
+    asset = static_data.get(path) if static_data and request.method == 'GET' else None
+    if asset is None:
+        return send_from_directory(current_app.config['DATA_FOLDER'], path)
+
+    # Precompressed once at startup; each encoding is its own representation
+    encoding = asset.encoding_for(request.accept_encodings)
+    response = send_file(asset.variants.get(encoding, asset.path), mimetype=asset.mimetype,
+                         conditional=False, etag=False)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+    if request.args.get('v') == asset.etag:
+        # Content-addressed URL from /txgnn_data_v2.json
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@vis.route('/txgnn_data_v2.json', methods=['GET'])
+def data_versions():
+    '''
+    :return: {filename: versioned url} for the static data files
+    '''
+    static_data = current_app.extensions.get('static_data')
+    return jsonify(static_data.versioned_urls('txgnn_data_v2') if static_data else {})
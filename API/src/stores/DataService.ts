@@ -12,20 +12,35 @@ const axiosInstance = axios.create({
   },
 });
 
+// Content-addressed URLs of the data files ({name: 'txgnn_data_v2/name?v=hash'}),
+// which the server lets the browser cache for good; plain URLs if unavailable
+let dataVersions: Promise<{ [name: string]: string }> | undefined;
+
+const dataURL = async (name: string): Promise<string> => {
+  if (!dataVersions) {
+    dataVersions = axiosInstance
+      .get(`./${DATA_URL}.json`)
+      .then((response) => response.data || {})
+      .catch(() => ({}));
+  }
+  const versions = await dataVersions;
+  return versions[name] ? `./${versions[name]}` : `./${DATA_URL}/${name}`;
+};
+
 const requestNodeTypes = async (): Promise<string[]> => {
-  const url = `./${DATA_URL}/node_types.json`;
+  const url = await dataURL('node_types.json');
   let response = await axiosInstance.get(url);
   return response.data;
 };
 
 const requestEdgeTypes = async (): Promise<IEdgeTypes> => {
-  const url = `./${DATA_URL}/edge_types.json`;
+  const url = await dataURL('edge_types.json');
   let response = await axiosInstance.get(url);
   return response.data;
 };
 
 const requestNodeNameDict = async () => {
-  const url = `./${DATA_URL}/node_name_dict.json`;
+  const url = await dataURL('node_name_dict.json');
   let response = await axiosInstance.get(url);
   return response.data;
 };
@@ -61,7 +76,7 @@ const requestAttentionPair = async (
   }
 };
 const requestDiseaseOptions = async () => {
-  const urlRanking = `./${DATA_URL}/disease_options.json`;
+  const urlRanking = await dataURL('disease_options.json');
   console.log("Requesting disease options from:", urlRanking);
   
   try {
@@ -102,7 +117,7 @@ const requestDrugPredictions = async (diseaseID: string) => {
 };
 
 const requestEmbedding = async () => {
-  const url = `./${DATA_URL}/drug_tsne.json`;
+  const url = await dataURL('drug_tsne.json');
   const response = await axiosInstance.get(url);
   return response.data;
 };